@@ -10,95 +10,119 @@
 #################################################################
 
 import os
-import requests
 import json
 from typing import List
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
-from IPython.display import Markdown, display, update_display
-from openai import OpenAI
-import anthropic
+import asyncio
+from clients import openai_client, anthropic_client, async_openai_client, async_anthropic_client
 import gradio as gr # oh yeah!
 from load_api_keys import load_api_keys
+from website import PageRegistry, Website
+from crawler import fetch_pages
+from pagecache import page_cache
+from prompt_budget import PromptAssembler
+from dedup import Deduplicator
+from fanout import fan_out
+from streaming import coalesce, coalesce_async
+from resultcache import make_key, replay, result_cache
+from linkfilter import MAX_CANDIDATES, cached_links, candidate_links, pick_links, store_links
+import ratelimit
 
 #################################################################
 # 2. Initialize, constants and class definitions
 #################################################################
 load_api_keys(False)
-openai = OpenAI()
-claude = anthropic.Anthropic()
+openai = openai_client()
+claude = anthropic_client()
+## async clients for the Gradio app: every open stream is a coroutine on the event loop instead of a worker thread
+aopenai = async_openai_client()
+aclaude = async_anthropic_client()
 debug = False
 MODEL_GPT ='gpt-4o-mini'
 MODEL_claude ='claude-3-haiku-20240307'
-
-# A class to represent a Webpage
-# Some websites need you to use proper headers when fetching them:
-headers = {
- "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
-}
-
-class Website:              ## A utility class to represent a Website that we have scraped, now with links
-    def __init__(self, url):
-        self.url = url
-        response = requests.get(url, headers=headers)
-        self.body = response.content
-        soup = BeautifulSoup(self.body, 'html.parser')
-        self.title = soup.title.string if soup.title else "No title found"
-        if soup.body:
-            for irrelevant in soup.body(["script", "style", "img", "input"]):
-                irrelevant.decompose()
-            self.text = soup.body.get_text(separator="\n", strip=True)
-        else:
-            self.text = ""
-        links = [link.get('href') for link in soup.find_all('a')]
-        self.links = [link for link in links if link]
-
-    def get_contents(self):
-        return f"Webpage Title:\n{self.title}\nWebpage Contents:\n{self.text}\n\n"
+CRAWL_WAVE = 4 # relevant pages fetched at the same time, between two budget checks
+LANGUAGES = ["English", "Dutch", "French", "West-Vlaams"]
 
 ## this functions gets the cleaned up page content, pases it to GPT with the build system & user prompt and retrieves the links in a json format
-def get_links(url, mtype = "brochure"):
-    website = Website(url)
-    response = openai.chat.completions.create(
-        model=MODEL_GPT,
-        messages=[
-            {"role": "system", "content": link_system_prompt},
-            {"role": "user", "content": get_links_user_prompt(website, mtype)}
-      ],
-        response_format={"type": "json_object"}
-    )
-    result = response.choices[0].message.content
-    return json.loads(result)
+## pass an already fetched Website to avoid downloading the landing page again; a plain url still works
+## the links are first filtered and ranked locally (see linkfilter.py); GPT is only asked when that is not conclusive,
+## and its answer is cached per domain
+def get_links(website, mtype = "brochure"):
+    if not isinstance(website, Website):
+        website = Website(website)
+    candidates = candidate_links(website)
+    links = pick_links(candidates)
+    if links is None:
+        links = cached_links(website.url, mtype)
+    if links is None:
+        response = ratelimit.call(MODEL_GPT, openai.chat.completions.create,
+            model=MODEL_GPT,
+            messages=[
+                {"role": "system", "content": link_system_prompt},
+                {"role": "user", "content": get_links_user_prompt(website, mtype, candidates[:MAX_CANDIDATES])}
+          ],
+            response_format={"type": "json_object"}
+        )
+        result = response.choices[0].message.content
+        links = json.loads(result)
+        store_links(website.url, mtype, links)
+    return links
 
 # this function composes the user_prompt for getting the relevant links based upon the website object that is passed on. (was on row 112)
-def get_links_user_prompt(website, mtype="brochure"):
+# links: the already filtered candidates, by default all links of the page
+def get_links_user_prompt(website, mtype="brochure", links=None):
+    if links is None:
+        links = website.links
     user_prompt = f"Here is the list of links on the website of {website.url} - "
     user_prompt += f"please decide which of these are relevant web links for a {mtype} about the company, respond with the full https URL in JSON format. \
 Do not include Terms of Service, Privacy, email links.\n"
     user_prompt += "Links (some might be relative links):\n"
-    user_prompt += "\n".join(website.links)
+    user_prompt += "\n".join(links)
     return user_prompt
 
 # creating the user prompt to compose the brochure for the specified company-name & url, building the user prompt
-def get_brochure_user_prompt(company_name, url, mtype="brochure", mtone="formal", llanguage="English"):
+# details: the result of get_all_details when the site was already crawled (e.g. for several languages), otherwise we crawl here
+def get_brochure_user_prompt(company_name, url, mtype="brochure", mtone="formal", llanguage="English", details=None):
+    if details is None:
+        details = get_all_details(url) # kept within the token budget, see prompt_budget.py
     user_prompt = f"You are looking at a company called: {company_name}\n"
     user_prompt += f"Here are the contents of its landing page and other relevant pages; use this information to build a short {mtone} {mtype} of the company in markdown and in the {llanguage} language.\n"
-    user_prompt += get_all_details(url)
-    user_prompt = user_prompt[:5_000] # Truncate if more than 5,000 characters
+    user_prompt += details
     return user_prompt
 
 # for the specified url, we are building the response, containing 
 #  1. the cleaned up content for the specified url
 #  2. the cleaned up content for the pages of the found (relevant) urls
+# the relevant pages are fetched by the crawl engine (see crawler.py), a few at the same time and the most valuable page types first;
+# every page type gets its share of the token budget and we stop fetching once the budget is used up
+# the registry makes sure every page is downloaded and parsed only once during this run
+# header, navigation and footer lines already seen on an earlier page are left out (see dedup.py)
 def get_all_details(url):
-    result = "Landing page:\n"
-    result += Website(url).get_contents()
-    links = get_links(url)
+    registry = PageRegistry()
+    assembler = PromptAssembler()
+    deduplicator = Deduplicator()
+    landing_page = registry.get(url)
+    kept = assembler.add("Landing page", "landing", landing_page.get_contents(deduplicator.filter(landing_page.text)))
+    deduplicator.remember(kept)     # not what the budget cut off, a later page may still bring that
+    links = get_links(landing_page)
     ## print("\n\nFound links:\n", links)
-    for link in links["links"]:
-        result += f"\n\n{link['type']}\n"
-        result += Website(link["url"]).get_contents()
-    return result
+    todo = sorted(links["links"], key=lambda link: assembler.priority(link["type"]))
+    while todo and not assembler.is_full():
+        wave = [link for link in todo if assembler.wants(link["type"])][:CRAWL_WAVE]
+        if not wave:
+            break
+        todo = [link for link in todo if link not in wave]
+        pages = fetch_pages([link["url"] for link in wave], registry=registry)
+        for link in wave:
+            if link["url"] in pages:
+                page = pages[link["url"]]
+                kept = assembler.add(link["type"], link["type"], page.get_contents(deduplicator.filter(page.text)))
+                deduplicator.remember(kept)
+    if debug:
+        print(page_cache.report())
+        print(f"Brochure prompt: {assembler.total_used} of {assembler.total} tokens, {len(registry.pages)} pages fetched, "
+              f"{deduplicator.lines_dropped} repeated lines dropped")
+    return assembler.text()
 
 #################################################################
 # 3. get input & validate the links
@@ -150,50 +174,148 @@ Include relevant details for #target_audience# where applicable of company cultu
 # Include details of company culture, customers and careers/jobs if you have the information."
 
 
-def stream_gpt(company_name, url, marketing_type, target_audience, marketing_tone, language):
-    stream = openai.chat.completions.create(
+# user_prompt: the already built brochure user prompt, when None it is built here (crawling the site)
+def stream_gpt(company_name, url, marketing_type, target_audience, marketing_tone, language, user_prompt=None):
+    if user_prompt is None:
+        user_prompt = get_brochure_user_prompt(company_name, url, marketing_type, marketing_tone, language)
+    stream = ratelimit.call(MODEL_GPT, openai.chat.completions.create,
         model=MODEL_GPT,
         messages=[
             {"role": "system", "content": system_prompt.replace("#target_audience#", target_audience)},
-            {"role": "user", "content": get_brochure_user_prompt(company_name, url, marketing_type, marketing_tone, language)}
+            {"role": "user", "content": user_prompt}
         ],
         stream=True
     )
     
-    result = ""
     print(f"Streaming Brochure with GPT")
-    for chunk in stream:
-        result += chunk.choices[0].delta.content or ""
-        yield result
+    ## the text so far, every STREAM_INTERVAL seconds instead of after every token (see streaming.py)
+    yield from coalesce(chunk.choices[0].delta.content for chunk in stream)
 
-def stream_claude(company_name, url, marketing_type, target_audience, marketing_tone, language):
-    result = claude.messages.stream(
+def stream_claude(company_name, url, marketing_type, target_audience, marketing_tone, language, user_prompt=None):
+    if user_prompt is None:
+        user_prompt = get_brochure_user_prompt(company_name, url, marketing_type, marketing_tone, language)
+    messages = [
+        {"role": "user", "content": user_prompt},
+    ]
+    system = system_prompt.replace("#target_audience#", target_audience)
+    print(f"Streaming Brochure with Claude")
+    ## the request only goes out when the stream is entered: ratelimit.stream enters it within the limits, retrying on 429
+    with ratelimit.stream(MODEL_claude, claude.messages.stream,
         model=MODEL_claude,
         max_tokens=2000,
         temperature=0.7,
-        system=system_prompt.replace("#target_audience#", target_audience),
+        system=system,
+        messages=messages,
+    ) as stream:
+        yield from coalesce(stream.text_stream)
+
+
+# the same form with the same website content gives the same brochure: it is then replayed from the result cache
+# (see resultcache.py) instead of generated again; the crawl itself is cheap thanks to the page cache
+def stream_model(company_name,website_url,marketing_type, target_audience, marketing_tone, language, mmodel, details=None):
+    if mmodel not in ("GPT", "Claude"):
+        raise ValueError("Unknown model")
+    user_prompt = get_brochure_user_prompt(company_name, website_url, marketing_type, marketing_tone, language, details)
+    key = make_key(company_name, website_url, marketing_type, target_audience, marketing_tone, language, mmodel,
+                   content=user_prompt)
+    cached = result_cache.get(key)
+    if cached is not None:
+        print("Replaying brochure from the result cache")
+        yield from replay(cached)
+        return
+    if mmodel=="GPT":
+        print("Streaming with GPT")
+        result = stream_gpt(company_name,website_url,marketing_type,target_audience,  marketing_tone, language, user_prompt)
+    else:
+        print("Streaming with Claude")
+        result = stream_claude(company_name,website_url,marketing_type, target_audience, marketing_tone, language, user_prompt)
+    yield from result_cache.stream(key, result)
+
+
+# async versions of the three functions above, used by the Gradio app: a user waiting for a brochure does not hold a worker thread
+# (only the crawl and prompt building still run in a thread)
+async def stream_gpt_async(company_name, url, marketing_type, target_audience, marketing_tone, language, user_prompt=None):
+    if user_prompt is None:
+        user_prompt = await asyncio.to_thread(get_brochure_user_prompt, company_name, url, marketing_type, marketing_tone, language)
+    stream = await ratelimit.call_async(MODEL_GPT, aopenai.chat.completions.create,
+        model=MODEL_GPT,
         messages=[
-            {"role": "user", "content": get_brochure_user_prompt(company_name, url, marketing_type, marketing_tone, language)},
+            {"role": "system", "content": system_prompt.replace("#target_audience#", target_audience)},
+            {"role": "user", "content": user_prompt}
         ],
+        stream=True
     )
-    response = ""
-    print(f"Streaming Brochure with Claude")
-    with result as stream:
-        for text in stream.text_stream:
-            response += text or ""
-            yield response
+    async for result in coalesce_async(chunk.choices[0].delta.content async for chunk in stream):
+        yield result
 
+async def stream_claude_async(company_name, url, marketing_type, target_audience, marketing_tone, language, user_prompt=None):
+    if user_prompt is None:
+        user_prompt = await asyncio.to_thread(get_brochure_user_prompt, company_name, url, marketing_type, marketing_tone, language)
+    messages = [
+        {"role": "user", "content": user_prompt},
+    ]
+    system = system_prompt.replace("#target_audience#", target_audience)
+    async with ratelimit.stream_async(MODEL_claude, aclaude.messages.stream,
+        model=MODEL_claude,
+        max_tokens=2000,
+        temperature=0.7,
+        system=system,
+        messages=messages,
+    ) as stream:
+        async for response in coalesce_async(stream.text_stream):
+            yield response
 
-def stream_model(company_name,website_url,marketing_type, target_audience, marketing_tone, language, mmodel):
+async def stream_model_async(company_name,website_url,marketing_type, target_audience, marketing_tone, language, mmodel, details=None):
+    if mmodel not in ("GPT", "Claude"):
+        raise ValueError("Unknown model")
+    user_prompt = await asyncio.to_thread(get_brochure_user_prompt, company_name, website_url, marketing_type, marketing_tone, language, details)
+    key = make_key(company_name, website_url, marketing_type, target_audience, marketing_tone, language, mmodel,
+                   content=user_prompt)
+    cached = result_cache.get(key)
+    if cached is not None:
+        print("Replaying brochure from the result cache")
+        for markdown in replay(cached):
+            yield markdown
+        return
     if mmodel=="GPT":
-        print("Streaming with GPT")
-        result = stream_gpt(company_name,website_url,marketing_type,target_audience,  marketing_tone, language)
-    elif mmodel=="Claude":
-        print("Streaming with Claude")
-        result = stream_claude(company_name,website_url,marketing_type, target_audience, marketing_tone, language)
+        result = stream_gpt_async(company_name,website_url,marketing_type,target_audience,  marketing_tone, language, user_prompt)
     else:
-        raise ValueError("Unknown model")
-    yield from result
+        result = stream_claude_async(company_name,website_url,marketing_type, target_audience, marketing_tone, language, user_prompt)
+    markdown = None
+    async for markdown in result:
+        yield markdown
+    if markdown:
+        result_cache.put(key, markdown)
+
+
+# batch mode: several versions of the brochure at once, every variant a (language, tone, model)
+# the site is crawled and the page contents assembled only once, then all variants are generated in parallel (see fanout.py),
+# GPT and Claude side by side, every variant streaming into its own output
+def stream_variants(company_name, website_url, marketing_type, target_audience, variants):
+    """Yields the list of the brochures so far, one per (language, tone, model) in variants."""
+    if not variants:
+        yield []
+        return
+    details = get_all_details(website_url)
+    generators = [stream_model(company_name, website_url, marketing_type, target_audience, tone, language, mmodel, details)
+                  for language, tone, mmodel in variants]
+    yield from fan_out(generators)
+
+
+def stream_languages(company_name, website_url, marketing_type, target_audience, marketing_tone, languages, mmodel):
+    languages = languages or []
+    for outputs in stream_variants(company_name, website_url, marketing_type, target_audience,
+                                   [(language, marketing_tone, mmodel) for language in languages]):
+        yield tuple(outputs[languages.index(language)] if language in languages else "" for language in LANGUAGES)
+
+
+## every combination of the languages, tones (comma separated) and models, shown one after the other in one output
+def stream_combinations(company_name, website_url, marketing_type, target_audience, marketing_tones, languages, models):
+    tones = [tone.strip() for tone in (marketing_tones or "").split(",") if tone.strip()] or [""]
+    variants = [(language, tone, mmodel) for language in languages or [] for tone in tones for mmodel in models or []]
+    for outputs in stream_variants(company_name, website_url, marketing_type, target_audience, variants):
+        yield "\n\n---\n\n".join(f"### {language} · {tone or 'default tone'} · {mmodel}\n\n{output}"
+                                   for (language, tone, mmodel), output in zip(variants, outputs))
 
 
 force_dark_mode = """
@@ -207,18 +329,52 @@ function refresh() {
 """
 
 view = gr.Interface(
-    fn=stream_model,
+    fn=stream_model_async,
     inputs=[gr.Textbox(label="Company Name:"), 
             gr.Textbox(label="Company URL:"), 
             gr.Textbox(label="Marketing Type:"), 
             gr.Textbox(label="Target Audience:"), 
             gr.Textbox(label="Marketing Tone:"),
-            gr.Dropdown(["English", "Dutch", "French","West-Vlaams"], label="Select Language", value="English"),
+            gr.Dropdown(LANGUAGES, label="Select Language", value="English"),
             gr.Dropdown(["GPT", "Claude"], label="Select model", value="GPT")],
     outputs=[gr.Markdown(label="Response:")],
     flagging_mode="never",
+    concurrency_limit=None, # async, so no reason to queue users behind each other (gradio's default is 1 at a time)
     js=force_dark_mode
     )
 
-view.launch(share=True)
+languages_view = gr.Interface(
+    fn=stream_languages,
+    inputs=[gr.Textbox(label="Company Name:"), 
+            gr.Textbox(label="Company URL:"), 
+            gr.Textbox(label="Marketing Type:"), 
+            gr.Textbox(label="Target Audience:"), 
+            gr.Textbox(label="Marketing Tone:"),
+            gr.CheckboxGroup(LANGUAGES, label="Select Languages", value=LANGUAGES),
+            gr.Dropdown(["GPT", "Claude"], label="Select model", value="GPT")],
+    outputs=[gr.Markdown(label=language) for language in LANGUAGES],
+    flagging_mode="never",
+    js=force_dark_mode
+    )
+
+combinations_view = gr.Interface(
+    fn=stream_combinations,
+    inputs=[gr.Textbox(label="Company Name:"), 
+            gr.Textbox(label="Company URL:"), 
+            gr.Textbox(label="Marketing Type:"), 
+            gr.Textbox(label="Target Audience:"), 
+            gr.Textbox(label="Marketing Tones (comma separated):", value="formal, humorous"),
+            gr.CheckboxGroup(LANGUAGES, label="Select Languages", value=["English"]),
+            gr.CheckboxGroup(["GPT", "Claude"], label="Select models", value=["GPT", "Claude"])],
+    outputs=[gr.Markdown(label="Brochures:")],
+    flagging_mode="never",
+    js=force_dark_mode
+    )
+
+ui = gr.TabbedInterface([view, languages_view, combinations_view], ["Brochure", "All languages", "Languages x tones x models"],
+                        js=force_dark_mode)
+
+# only launch when run as a script, so the brochure functions can be imported (e.g. by brochure_batch.py)
+if __name__ == "__main__":
+    ui.launch(share=True)
 #share=False
\ No newline at end of file
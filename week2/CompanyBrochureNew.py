@@ -12,18 +12,17 @@ import requests
 import json
 from typing import List
 from dotenv import load_dotenv
-from bs4 import BeautifulSoup
 import gradio as gr
-from openai import OpenAI
-import anthropic
+from clients import openai_client, anthropic_client
 from load_api_keys import load_api_keys
+import ratelimit
 
 #################################################################
 # 2. Initialization, Constants, and Class Definitions
 #################################################################
 load_api_keys(False)
-openai = OpenAI()
-claude = anthropic.Anthropic()
+openai = openai_client()
+claude = anthropic_client()
 
 # Constants
 debug = False
@@ -41,6 +40,7 @@ class Website:
         self.url = url
         response = requests.get(url, headers=headers)
         self.body = response.content
+        from bs4 import BeautifulSoup     # only needed when a site is scraped
         soup = BeautifulSoup(self.body, 'html.parser')
         self.title = soup.title.string if soup.title else "No title found"
         if soup.body:
@@ -62,7 +62,7 @@ class Website:
 def get_links(url, mtype="brochure"):
     """Retrieve relevant links from the website using GPT."""
     website = Website(url)
-    response = openai.chat.completions.create(
+    response = ratelimit.call(MODEL_GPT, openai.chat.completions.create,
         model=MODEL_GPT,
         messages=[
             {"role": "system", "content": link_system_prompt},
@@ -128,7 +128,7 @@ system_prompt += f"Include relevant details for #target_audience# where applicab
 
 def stream_gpt(company_name, url, marketing_type, target_audience, marketing_tone, language):
     """Stream GPT response."""
-    stream = openai.chat.completions.create(
+    stream = ratelimit.call(MODEL_GPT, openai.chat.completions.create,
         model=MODEL_GPT,
         messages=[
             {"role": "system", "content": system_prompt.replace("#target_audience#", target_audience)},
@@ -144,7 +144,8 @@ def stream_gpt(company_name, url, marketing_type, target_audience, marketing_ton
 
 def stream_claude(company_name, url, marketing_type, target_audience, marketing_tone, language):
     """Stream Claude response."""
-    result = claude.messages.stream(
+    ## the request goes out when the stream is entered, within the shared rate limits (see ratelimit.py)
+    result = ratelimit.stream(MODEL_CLAUDE, claude.messages.stream,
         model=MODEL_CLAUDE,
         max_tokens=2000,
         temperature=0.7,
@@ -2,23 +2,20 @@
 
 import os
 import requests
-from bs4 import BeautifulSoup
 from typing import List
 from dotenv import load_dotenv
-from openai import OpenAI
-import google.generativeai
-import anthropic
+from clients import openai_client, anthropic_client
 import gradio as gr # oh yeah!
 from load_api_keys import load_api_keys
+import ratelimit
 import CompanyBrochure
 
 # load the api keys
 load_api_keys(False)
 
 #intiliaze the objects
-openai = OpenAI()
-claude = anthropic.Anthropic()
-google.generativeai.configure()
+openai = openai_client()
+claude = anthropic_client()
 
 # Let's wrap a call to GPT-4o-mini in a simple function
 
@@ -28,7 +25,7 @@ def message_gpt(u_prompt,s_message = ""):
         {"role": "system", "content": s_message},
         {"role": "user", "content": u_prompt}
       ]
-    completion = openai.chat.completions.create(
+    completion = ratelimit.call('gpt-4o-mini', openai.chat.completions.create,
         model='gpt-4o-mini',
         messages=messages
     )
@@ -41,7 +38,7 @@ def stream_gpt(u_prompt):
         {"role": "system", "content": s_message},
         {"role": "user", "content": u_prompt}
       ]
-    stream = openai.chat.completions.create(
+    stream = ratelimit.call('gpt-4o-mini', openai.chat.completions.create,
         model='gpt-4o-mini',
         messages=messages,
         stream=True
@@ -54,7 +51,8 @@ def stream_gpt(u_prompt):
 
 def stream_claude(u_prompt):
     s_message = "You are a helpful assistant"
-    result = claude.messages.stream(
+    ## the request goes out when the stream is entered, within the shared rate limits (see ratelimit.py)
+    result = ratelimit.stream("claude-3-haiku-20240307", claude.messages.stream,
         model="claude-3-haiku-20240307",
         max_tokens=1000,
         temperature=0.7,
@@ -97,4 +95,6 @@ view = gr.Interface(
     js=force_dark_mode
     )
 
+# importing CompanyBrochure no longer launches its interface, so start it here, before our own one as before
+CompanyBrochure.ui.launch(share=True)
 view.launch(share=True)
\ No newline at end of file
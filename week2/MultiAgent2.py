@@ -1,20 +1,20 @@
+import functools
 import os
-import json
 from dotenv import load_dotenv
-import pandas as pd
-from openai import OpenAI
+from pricestore import PriceStore
+from clients import openai_client
 import gradio as gr
 from load_api_keys import load_api_keys
-import bookagenda as book
+from bookingqueue import booking_key, booking_queue
+import ratelimit
+from toolcalls import chat_with_tools
 import tempfile
 import subprocess
 from io import BytesIO
-from pydub import AudioSegment
 import time
 # Some imports for handling images
 import base64
-from io import BytesIO
-from PIL import Image
+## pydub and PIL are imported in talker() and artist(), a session without audio or images never loads them
 
 # Load environment variables and API keys from .env
 load_api_keys(False)
@@ -54,20 +54,13 @@ function refresh() {
     }
 }
 """
-# Read the Excel sheet into a pandas DataFrame
-# Convert the DataFrame into a dictionary
-try:
-    df = pd.read_excel(flights_file_name, sheet_name=flights_sheet_name)
-    ticket_prices = dict(zip(df["destination"], df["ticket_prices"]))
-except FileNotFoundError:
-    print(f"Error: File '{flights_file_name}' not found.")
-    ticket_prices = {}
-except Exception as e:
-    print(f"Error loading flights data: {e}")
-    ticket_prices = {}
-
-openai = OpenAI()
-## claude = anthropic.Anthropic()
+## the ticket prices come from flights.xlsx, compiled into flights.sqlite and reloaded when the sheet changes (see pricestore.py)
+price_store = PriceStore(flights_file_name, flights_sheet_name)
+
+openai = openai_client()
+## books what was still queued when the app stopped
+booking_queue.start()
+## claude = anthropic_client()
 GPT_MODEL = "gpt-4o-mini"
 IMG_MODEL = "dall-e-3"
 # claude_model = "claude-3-haiku-20240307"
@@ -76,10 +69,18 @@ IMG_MODEL = "dall-e-3"
 
 def get_ticket_price(destination_city):
     if not destination_city:
-        return "Invalid destination. Please provide a valid city."
+        return {"destination_city": destination_city, "price": "Invalid destination. Please provide a valid city."}
     print(f"Tool get_ticket_price called for {destination_city}")
-    city = destination_city.lower()
-    return ticket_prices.get(city, "Unknown")
+    ## "London ", "NEW-YORK" and typos like "Londen" all find the city; the answer names the city that was found,
+    ## so for a typo the model can ask "did you mean London?" instead of quoting that price for another place
+    match = price_store.lookup(destination_city)
+    if match is None:
+        return {"destination_city": destination_city, "price": "Unknown"}
+    name, price, exact = match
+    result = {"destination_city": name, "price": price}
+    if not exact:
+        result["note"] = f"There is no destination called {destination_city}, this is the price to {name}. Ask the customer if they meant {name}."
+    return result
 
 
 def artist(city):
@@ -92,6 +93,7 @@ def artist(city):
         )
     image_base64 = image_response.data[0].b64_json
     image_data = base64.b64decode(image_base64)
+    from PIL import Image
     return Image.open(BytesIO(image_data))
 
 # def chat(message, history):
@@ -125,32 +127,14 @@ def artist(city):
 #         talker(response.choices[0].message.content)
 #     return response.choices[0].message.content
 
-def chat(history):
+def chat(history, request: gr.Request = None):
     messages = [{"role": "system", "content": SYSTEM_MESSAGE}] + history #+ [{"role": "user", "content": message}]
-    response = openai.chat.completions.create(model=GPT_MODEL, messages=messages, tools=tools)
-#    messages = [{"role": "system", "content": SYSTEM_MESSAGE}] + history
+    ## all tool calls of an answer run at the same time ("price + book" is one round trip), see toolcalls.py
+    response, calls = chat_with_tools(create_chat, messages, tools, session_handlers(request))
     image = None
-    
-    if response.choices[0].finish_reason=="tool_calls":
-        message = response.choices[0].message
-        tool_call = message.tool_calls[0]
-        arguments = json.loads(tool_call.function.arguments)
-        ddate = arguments.get('travel_date')
-        city = arguments.get('destination_city')
-        if response.choices[0].message.tool_calls[0].function.name =="get_ticket_price":
-            response, city = handle_tool_call(message)
-            print(f"Ticket price for : {city}")
-        elif response.choices[0].message.tool_calls[0].function.name =="make_booking_int":
-            response = book.make_booking_int(city,ddate, tool_call.id)
-            print(f"Flight booked for : {city} on {ddate}")
-            image = artist(city)
-        else:
-            print("Not a common message.")
-        messages.append(message)
-        messages.append(response)
-               
-        response = openai.chat.completions.create(model=GPT_MODEL, messages=messages)
-        #talker(response.choices[0].message.content)
+    booked = [arguments.get("destination_city") for name, arguments in calls if name == "make_booking_int"]
+    if booked:
+        image = artist(booked[-1])
     
     reply = response.choices[0].message.content
     history += [{"role":"assistant", "content":reply}]
@@ -182,17 +166,31 @@ def chat(history):
 #     return history, image
 
 
-def handle_tool_call(message):
-    tool_call = message.tool_calls[0]
-    arguments = json.loads(tool_call.function.arguments)
-    city = arguments.get('destination_city')
-    price = get_ticket_price(city)
-    response = {
-        "role": "tool",
-        "content": json.dumps({"destination_city": city,"price": price}),
-        "tool_call_id": tool_call.id
-    }
-    return response, city
+def create_chat(**kwargs):
+    return ratelimit.call(GPT_MODEL, openai.chat.completions.create, model=GPT_MODEL, **kwargs)
+
+## the python functions behind the tools, they get the arguments the model filled in
+def price_tool(destination_city=None):
+    print(f"Ticket price for : {destination_city}")
+    return get_ticket_price(destination_city)
+
+## the booking is queued and acknowledged with a reference right away, the calendar event is made in the
+## background (see bookingqueue.py), so the answer does not wait for the calendar
+def booking_tool(destination_city=None, travel_date=None, session=None):
+    job = booking_queue.enqueue(destination_city, travel_date, booking_key(session, destination_city, travel_date))
+    print(f"Flight booking {job['reference']} queued for : {destination_city} on {travel_date}")
+    return job
+
+def booking_status_tool(booking_reference=None):
+    job = booking_queue.status(booking_reference)
+    return job if job is not None else {"error": f"Unknown booking reference {booking_reference}"}
+
+tool_handlers = {"get_ticket_price": price_tool, "make_booking_int": booking_tool, "get_booking_status": booking_status_tool}
+
+## the bookings of one browser session (Gradio's session hash) share their idempotency keys, see bookingqueue.py
+def session_handlers(request):
+    session = getattr(request, "session_hash", None)
+    return dict(tool_handlers, make_booking_int=functools.partial(booking_tool, session=session))
 
 def play_audio(audio_segment):
     temp_dir = tempfile.gettempdir()
@@ -220,6 +218,7 @@ def talker(message):
         input=message
     )
     audio_stream = BytesIO(response.content)
+    from pydub import AudioSegment
     audio = AudioSegment.from_file(audio_stream, format="mp3")
     play_audio(audio)
 
@@ -242,7 +241,8 @@ price_function = {
 calendar_book_function = {
     "name": "make_booking_int",
     "description": "Put the flight to the destination into the calendar. Make that the user knows what the price is for the flight. \
-        Ask which date the flight needs to be booked. Call this whenever the flight needs to be booked, for example when a customer says 'ok, go ahead and book the flight'",
+        Ask which date the flight needs to be booked. Call this whenever the flight needs to be booked, for example when a customer says 'ok, go ahead and book the flight'. \
+        The booking is put in the calendar in the background: give the customer the booking reference it returns.",
     "parameters": {
         "type": "object",
         "properties": {
@@ -261,12 +261,30 @@ calendar_book_function = {
     }
 }
 
+booking_status_function = {
+    "name": "get_booking_status",
+    "description": "Get the status of a flight booking (queued, booked or failed) by its booking reference. \
+        Call this whenever a customer asks whether a booking went through, for example 'is my flight booked?'",
+    "parameters": {
+        "type": "object",
+        "properties": {
+            "booking_reference": {
+                "type": "string",
+                "description": "The booking reference, for example FA-3F9C2A71",
+            },
+        },
+        "required": ["booking_reference"],
+        "additionalProperties": False
+    }
+}
+
 
 
 # And this is included in a list of tools:
 tools = [
     {"type": "function", "function": price_function},
     {"type": "function", "function": calendar_book_function},
+    {"type": "function", "function": booking_status_function},
 ]
 
 # gr.ChatInterface(fn=chat, type="messages", js=force_dark_mode ).launch()µ
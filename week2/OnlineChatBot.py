@@ -3,14 +3,17 @@
 # imports
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
+from clients import openai_client, anthropic_client
 import gradio as gr
-import anthropic
 from load_api_keys import load_api_keys
+import ratelimit
+from streaming import coalesce
+from history import history_manager
+from promptcache import STREAM_USAGE, openai_pieces
 from typing import Generator, Dict, List
 
-openai = OpenAI()
-claude = anthropic.Anthropic()
+openai = openai_client()
+claude = anthropic_client()
 gpt_model = "gpt-4o-mini"
 claude_model = "claude-3-haiku-20240307"
 model_type = "Claude"
@@ -59,19 +62,21 @@ function refresh() {
 """
 def chat_gpt(message, history):
 
-    relevant_system_message = system_message
+    # the long persona stays the unchanged first message on every turn, so OpenAI serves it from its prompt cache;
+    # a note for this turn only goes after the history (see promptcache.py)
+    note = None
     if 'belt' in message:
-        relevant_system_message += " The store does not sell belts; if you are asked for belts, be sure to point out other items on sale."
+        note = "The store does not sell belts; if you are asked for belts, be sure to point out other items on sale."
     
     print(message)
-    messages = [{"role": "system", "content": relevant_system_message}] + history + [{"role": "user", "content": message}]
+    # the last turns verbatim, the older ones as a summary (see history.py)
+    messages = history_manager.messages(system_message, history, message, note)
 
-    stream = openai.chat.completions.create(model=gpt_model, messages=messages, stream=True)
+    stream = ratelimit.call(gpt_model, openai.chat.completions.create, model=gpt_model, messages=messages, stream=True,
+                            stream_options=STREAM_USAGE)
 
-    response = ""
-    for chunk in stream:
-        response += chunk.choices[0].delta.content or ''
-        yield response
+    # the answer so far every few tokens instead of after every token, see streaming.py
+    yield from coalesce(openai_pieces(stream, "Ronaldo"))
 
 gr.ChatInterface(fn=chat_gpt, type="messages", js=force_dark_mode).launch(share=True)
 
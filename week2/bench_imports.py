@@ -0,0 +1,78 @@
+# coding: utf-8
+
+# Import time profile of the apps (cold start). Importing an app would launch its Gradio server, so for every app
+# only its top-level import statements are run, in a fresh interpreter with python -X importtime. The report shows
+# the total import time and the packages that took the longest (cumulative, including what they import).
+#
+#   python bench_imports.py                         # all apps
+#   python bench_imports.py MultiAgent.py day3.py   # some apps
+#   python bench_imports.py --raw importtime.txt    # also save the full -X importtime output
+#
+# Imports that fail (a package that is not installed) are reported and skipped.
+# Run it a few times, the first run also measures the disk cache and compiling to .pyc.
+
+import ast
+import os
+import subprocess
+import sys
+import time
+
+APPS = ["CompanyBrochure.py", "CompanyBrochureNew.py", "CompanyBrochureOnline.py", "MultiAgent.py", "MultiAgent2.py",
+        "OnlineChatBot.py", "chatbetweenbots.py", "day3.py", "gradio_example.py"]
+TOP = 8
+
+
+def top_level_imports(path):
+    """The import statements at the top level of the file (not the ones inside functions)."""
+    with open(path, encoding="utf-8") as file:
+        source = file.read()
+    return [ast.get_source_segment(source, node) for node in ast.parse(source).body
+            if isinstance(node, (ast.Import, ast.ImportFrom))]
+
+
+def profile(statements):
+    """Run the imports in a new interpreter; returns (wall seconds, {package: cumulative us}, missing, raw output)."""
+    code = "\n".join(f"try:\n    {statement}\nexcept ImportError as e:\n    print('missing', e.name)"
+                     for statement in statements)
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                            capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = time.perf_counter() - start
+    packages = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # the top-level imports are the ones without indentation
+        if not cumulative.strip().isdigit() or name.startswith("  "):
+            continue
+        packages[name.strip()] = packages.get(name.strip(), 0) + int(cumulative)
+    missing = [line.split()[1] for line in result.stdout.splitlines() if line.startswith("missing ")]
+    return elapsed, packages, missing, result.stderr
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    raw_file = None
+    if "--raw" in arguments:
+        index = arguments.index("--raw")
+        raw_file = arguments[index + 1]
+        del arguments[index:index + 2]
+    apps = arguments or APPS
+
+    baseline, _, _, _ = profile([])
+    print(f"empty interpreter: {baseline * 1000:.0f} ms\n")
+    print(f"{'app':<26} {'wall ms':>8} {'imports ms':>11}  heaviest imports (cumulative ms)")
+    raw = []
+    for app in apps:
+        elapsed, packages, missing, stderr = profile(top_level_imports(app))
+        raw.append(f"### {app}\n{stderr}")
+        heaviest = sorted(packages.items(), key=lambda item: -item[1])[:TOP]
+        print(f"{app:<26} {elapsed * 1000:8.0f} {sum(packages.values()) / 1000:11.0f}  "
+              + ", ".join(f"{name} {us / 1000:.0f}" for name, us in heaviest))
+        if missing:
+            print(f"{'':<26} not installed: {', '.join(missing)}")
+    if raw_file:
+        with open(raw_file, "w", encoding="utf-8") as file:
+            file.write("\n".join(raw))
+        print(f"\nFull -X importtime output in {raw_file}")
@@ -0,0 +1,64 @@
+# coding: utf-8
+
+# Benchmark of the html parser backends in parsers.py over the saved html fixtures.
+# For every backend it reports the throughput and the peak Python memory while parsing,
+# and checks that the output is identical to the reference "html.parser" backend.
+#
+#   python bench_parsers.py                     # all fixtures under fixtures/
+#   python bench_parsers.py my_pages/*.html     # your own saved pages
+#
+# Note: tracemalloc only sees memory allocated through Python, the C buffers of lxml are not counted.
+
+import glob
+import sys
+import time
+import tracemalloc
+
+from parsers import PARSERS
+
+ROUNDS = 20
+
+
+def load_corpus(paths):
+    return {path: open(path, "rb").read() for path in paths}
+
+
+def bench(backend, corpus, rounds=ROUNDS):
+    parse = PARSERS[backend]
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for body in corpus.values():
+            parse(body)
+    elapsed = time.perf_counter() - start
+
+    peak = 0
+    for body in corpus.values():
+        tracemalloc.start()
+        parse(body)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def check_identical(backend, corpus):
+    reference = PARSERS["html.parser"]
+    return [path for path, body in corpus.items() if PARSERS[backend](body) != reference(body)]
+
+
+if __name__ == "__main__":
+    paths = sys.argv[1:] or sorted(glob.glob("fixtures/**/*.html", recursive=True))
+    corpus = load_corpus(paths)
+    total_bytes = sum(len(body) for body in corpus.values())
+    print(f"{len(corpus)} pages, {total_bytes / 1024:.0f} KB, {ROUNDS} rounds\n")
+    print(f"{'backend':<12} {'pages/s':>9} {'MB/s':>7} {'peak KB':>9}  output")
+    for backend in PARSERS:
+        try:
+            elapsed, peak = bench(backend, corpus)
+        except ImportError as e:
+            print(f"{backend:<12} skipped: {e}")
+            continue
+        different = check_identical(backend, corpus)
+        pages_per_second = len(corpus) * ROUNDS / elapsed
+        mb_per_second = total_bytes * ROUNDS / elapsed / 1024 / 1024
+        status = "identical" if not different else "DIFFERS on " + ", ".join(different)
+        print(f"{backend:<12} {pages_per_second:9.1f} {mb_per_second:7.2f} {peak / 1024:9.0f}  {status}")
@@ -1,10 +1,39 @@
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+## the google client libraries are imported in calendar_service(), when the first booking is made, not when the agent starts
 import datetime
 import json
 import os
+import random
+import threading
+import time
+import uuid
+from urllib.parse import urljoin
+
+## One calendar service for the whole process: token.json is read and the service is built (from the discovery
+## document that ships with google-api-python-client, no discovery fetch) on the first booking only. A booking
+## is then a single API call. The access token is refreshed shortly before it expires, so a booking never
+## waits on a refresh after a failed call.
+## CALENDAR_API_ENDPOINT points the service to another server, e.g. the local stand-in fake_calendar_server.py:
+##   CALENDAR_API_ENDPOINT=http://127.0.0.1:8002/calendar/v3/ CALENDAR_TOKEN_URI=http://127.0.0.1:8002/token
+SCOPES = ['https://www.googleapis.com/auth/calendar']
+TOKEN_FILE = os.getenv("CALENDAR_TOKEN_FILE", "token.json")
+CREDENTIALS_FILE = os.getenv("CALENDAR_CREDENTIALS_FILE", "credentials.json")
+CALENDAR_API_ENDPOINT = os.getenv("CALENDAR_API_ENDPOINT")
+CALENDAR_TOKEN_URI = os.getenv("CALENDAR_TOKEN_URI")     # google-auth ignores the token_uri in token.json
+CALENDAR_TIMEOUT = float(os.getenv("CALENDAR_TIMEOUT", 30))
+TOKEN_REFRESH_MARGIN = datetime.timedelta(seconds=int(os.getenv("TOKEN_REFRESH_MARGIN", 300)))
+## book_meetings(): the events go in batch requests of at most BATCH_SIZE (the Calendar API limit is 50),
+## the items that failed with a temporary error are sent again, at most BATCH_RETRIES times
+BATCH_SIZE = min(int(os.getenv("CALENDAR_BATCH_SIZE", 50)), 50)
+BATCH_RETRIES = int(os.getenv("CALENDAR_BATCH_RETRIES", 5))
+BASE_BACKOFF = 1
+MAX_BACKOFF = 32
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+RETRY_REASONS = {"rateLimitExceeded", "userRateLimitExceeded"}     # sent with a 403
+
+_creds = None
+_service = None
+_lock = threading.Lock()
+_local = threading.local()      # httplib2 is not thread safe: one authorized connection per thread
 
 def set_event_details(destination,ddate="2025-01-01"):
     l_destination = "Trip to " + str(destination)
@@ -34,6 +63,122 @@ def make_booking_int(city, ddate, tool_call_id):
     }
     return response
 
+def _credentials():
+    """The cached credentials, refreshed when they expire within TOKEN_REFRESH_MARGIN. Call with _lock held."""
+    global _creds
+    from google.auth.transport.requests import Request
+    from google.oauth2.credentials import Credentials
+    from google_auth_oauthlib.flow import InstalledAppFlow
+
+    if _creds is None and os.path.exists(TOKEN_FILE):
+        _creds = Credentials.from_authorized_user_file(TOKEN_FILE, SCOPES)
+        if CALENDAR_TOKEN_URI:
+            expiry = _creds.expiry      # the copy loses it
+            _creds = _creds.with_token_uri(CALENDAR_TOKEN_URI)
+            _creds.expiry = expiry
+    # expiry is a naive UTC datetime
+    expiring = _creds is not None and _creds.expiry is not None and \
+        _creds.expiry - datetime.datetime.utcnow() < TOKEN_REFRESH_MARGIN
+    if _creds is None or not _creds.valid or expiring:
+        if _creds and _creds.refresh_token:
+            _creds.refresh(Request())
+        else:
+            # no usable token: log in in the browser
+            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_FILE, SCOPES)
+            _creds = flow.run_local_server(port=0)
+        _save(_creds)
+    return _creds
+
+
+def _save(creds):
+    # Save the credentials for future use
+    with open(TOKEN_FILE, 'w') as token:
+        token.write(creds.to_json())
+
+
+def _locked(creds):
+    """creds as the per-thread connections use them: a refresh (token about to expire, or a 401) only happens
+    under _lock, and only once when several threads need it at the same time. It is a google-auth Credentials,
+    googleapiclient checks that for batch requests."""
+    import google.auth.credentials
+
+    class LockedCredentials(google.auth.credentials.Credentials):
+        def __init__(self):
+            pass        # no state of its own, everything is read from creds
+
+        token = property(lambda self: creds.token)
+        expiry = property(lambda self: creds.expiry)
+        expired = property(lambda self: creds.expired)
+        valid = property(lambda self: creds.valid)
+
+        def apply(self, headers, token=None):
+            creds.apply(headers, token)
+
+        def before_request(self, request, method, url, headers):
+            if not creds.valid:
+                self.refresh(request)
+            creds.apply(headers)
+
+        def refresh(self, request):
+            token = creds.token
+            with _lock:
+                if creds.token == token:        # not refreshed by another thread in the meantime
+                    creds.refresh(request)
+                    _save(creds)
+
+        def __getattr__(self, name):
+            return getattr(creds, name)
+
+    return LockedCredentials()
+
+
+def calendar_service():
+    """The calendar service of the process, built on first use."""
+    global _service
+    from googleapiclient.discovery import build
+
+    with _lock:
+        creds = _credentials()
+        if _service is None:
+            client_options = {"api_endpoint": CALENDAR_API_ENDPOINT} if CALENDAR_API_ENDPOINT else None
+            _service = build('calendar', 'v3', credentials=creds, static_discovery=True, cache_discovery=False,
+                             client_options=client_options)
+        return _service
+
+
+def _http():
+    """The authorized connection of this thread, made again when the credentials were replaced (a new login)."""
+    import google_auth_httplib2
+    import httplib2
+
+    creds = _creds
+    if getattr(_local, "creds", None) is not creds:
+        _local.creds = creds
+        _local.http = google_auth_httplib2.AuthorizedHttp(_locked(creds),
+                                                          http=httplib2.Http(timeout=CALENDAR_TIMEOUT))
+    return _local.http
+
+
+def event_body(event_details):
+    body = {
+        'summary': event_details['summary'],
+        'description': event_details['description'],
+        'start': {
+            'dateTime': event_details['start_time'],
+            'timeZone': 'UTC',  # Change the timezone if needed
+        },
+        'end': {
+            'dateTime': event_details['end_time'],
+            'timeZone': 'UTC',  # Change the timezone if needed
+        },
+        'attendees': [{'email': email} for email in event_details.get('attendees', [])],
+    }
+    if event_details.get('event_id'):
+        # our own id: inserting the same event again gives a 409 instead of a second event
+        body['id'] = event_details['event_id']
+    return body
+
+
 # Define a function to book a meeting in Google Calendar
 def book_meeting(event_details, destination):
     """
@@ -50,51 +195,99 @@ def book_meeting(event_details, destination):
     Returns:
         dict: Information about the created event.
     """
-
-    SCOPES = ['https://www.googleapis.com/auth/calendar']
-
-    def authenticate_google():
-        creds = None
-        # Check if token.json exists
-        if os.path.exists('token.json'):
-            creds = Credentials.from_authorized_user_file('token.json', SCOPES)
-        # If there are no valid credentials, prompt for login
-        
-        if not creds or not creds.valid:
-            if creds and creds.expired and creds.refresh_token:
-                creds.refresh(Request())
-            else:
-                flow = InstalledAppFlow.from_client_secrets_file('credentials.json', SCOPES)
-                creds = flow.run_local_server(port=0)
-            # Save the credentials for future use
-            with open('token.json', 'w') as token:
-                token.write(creds.to_json())
-        return creds
-
-    # Initialize the Google Calendar API service
-    creds = authenticate_google()
-    service = build('calendar', 'v3', credentials=creds)
-    
-    # Create the event body
-    event = {
-        'summary': event_details['summary'],
-        'description': event_details['description'],
-        'start': {
-            'dateTime': event_details['start_time'],
-            'timeZone': 'UTC',  # Change the timezone if needed
-        },
-        'end': {
-            'dateTime': event_details['end_time'],
-            'timeZone': 'UTC',  # Change the timezone if needed
-        },
-        'attendees': [{'email': email} for email in event_details.get('attendees', [])],
-    }
+    service = calendar_service()
 
     # Add the event to the primary calendar
-    created_event = service.events().insert(calendarId='primary', body=event).execute()
+    created_event = service.events().insert(calendarId='primary', body=event_body(event_details)).execute(http=_http())
 
     return created_event
 
+
+def _batch_request(service, callback):
+    if CALENDAR_API_ENDPOINT:
+        # new_batch_http_request() always uses the Google url, not the api_endpoint
+        from googleapiclient.http import BatchHttpRequest
+        return BatchHttpRequest(callback=callback, batch_uri=urljoin(CALENDAR_API_ENDPOINT, "/batch/calendar/v3"))
+    return service.new_batch_http_request(callback=callback)
+
+
+def _retryable(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "resp", None), "status", None)
+    if status is None:
+        return True         # no answer at all (connection, timeout)
+    if status == 403:
+        details = getattr(error, "error_details", None) or []
+        return any(isinstance(detail, dict) and detail.get("reason") in RETRY_REASONS for detail in details)
+    return status in RETRY_STATUSES
+
+
+def _describe(error):
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "resp", None), "status", None)
+    reason = error.reason if hasattr(error, "reason") else str(error)
+    return {"error": reason, "status": status}
+
+
+def book_meetings(events_details, retries=BATCH_RETRIES):
+    """
+    Schedule many meetings with a few batch requests instead of one request per meeting.
+
+    Args:
+        events_details (list): event_details dicts as made by set_event_details().
+        retries (int): how many times the items that failed with a temporary error are sent again.
+
+    Returns:
+        list: per meeting, in the same order, {"event": the created event} or {"error": message, "status": http status}.
+    """
+    from googleapiclient.errors import HttpError
+
+    service = calendar_service()
+    # every event gets its id up front, so sending it again after a lost answer cannot book it twice
+    details = [dict(event_details, event_id=event_details.get('event_id') or uuid.uuid4().hex)
+               for event_details in events_details]
+    results = [None] * len(details)
+    pending = list(range(len(details)))
+
+    for attempt in range(retries + 1):
+        failed = []
+
+        def callback(request_id, response, exception):
+            index = int(request_id)
+            if exception is None:
+                results[index] = {"event": response}
+            elif isinstance(exception, HttpError) and exception.status_code == 409:
+                # the event is already there: an earlier attempt got through
+                results[index] = {"event": {"id": details[index]['event_id'], "status": "confirmed"}}
+            else:
+                results[index] = _describe(exception)
+                if _retryable(exception):
+                    failed.append(index)
+
+        for start in range(0, len(pending), BATCH_SIZE):
+            chunk = pending[start:start + BATCH_SIZE]
+            batch = _batch_request(service, callback)
+            for index in chunk:
+                batch.add(service.events().insert(calendarId='primary', body=event_body(details[index])),
+                          request_id=str(index))
+            try:
+                batch.execute(http=_http())
+            except Exception as e:
+                # the batch request itself failed: all of its items are tried again
+                for index in chunk:
+                    if results[index] is None or "error" in results[index]:
+                        results[index] = _describe(e)
+                        if index not in failed and _retryable(e):
+                            failed.append(index)
+
+        pending = sorted(failed)
+        if not pending or attempt == retries:
+            break
+        # full jitter, like ratelimit.py
+        time.sleep(random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt)))
+
+    booked = sum(1 for result in results if "event" in result)
+    print(f"Meetings scheduled: {booked} of {len(results)}")
+    return results
+
 # Example usage
 #try:
 destination = "London"
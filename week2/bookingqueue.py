@@ -0,0 +1,196 @@
+# coding: utf-8
+
+# Booking queue for the FlightAI agents, so a chat turn never waits for the calendar (token refresh + insert).
+# The booking tool only stores the booking in a small SQLite file and answers right away with a booking
+# reference; a background thread makes the calendar events (bookagenda.book_meetings, in batches) and the chat
+# can ask for the status of a reference later.
+#
+# - durable: the queue is a SQLite file, bookings that were not made yet are picked up again after a restart
+# - idempotency key: the same key booked twice gives the same reference and one calendar event. The agents use
+#   booking_key(): the chat session + city + date, so a customer asking twice gets one booking and two customers
+#   get two; without a key every booking is a new one. The event id is derived from the key, so a calendar insert
+#   that got through just before a crash is not made a second time either (409, which counts as booked)
+# - a booking that failed with a temporary error is tried again later (backoff), at most BOOKING_ATTEMPTS times;
+#   booking a failed one again (same key) queues it again
+#
+#   job = booking_queue.enqueue("london", "2025-03-01", booking_key(session, "london", "2025-03-01"))
+#                                                            -> {"reference": "FA-3F9C2A71", "status": "queued", ...}
+#   booking_queue.status("FA-3F9C2A71")                      -> {..., "status": "booked", "link": "https://..."}
+#
+# Only one process should use a queue file (a job being booked when the process stopped is queued again on start).
+
+import datetime
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+import bookagenda as book
+
+QUEUE_FILE = os.getenv("BOOKING_QUEUE_FILE", "bookings.sqlite")
+BOOKING_ATTEMPTS = int(os.getenv("BOOKING_ATTEMPTS", 5))
+RETRY_DELAY = 30            # seconds before the second attempt, doubled for every next one
+MAX_RETRY_DELAY = 3600
+POLL_SECONDS = 5            # the worker also looks for due retries this often
+
+QUEUED, BOOKING, BOOKED, FAILED = "queued", "booking", "booked", "failed"
+
+
+def booking_key(session, city, travel_date):
+    """Idempotency key of a booking in a chat session, None (a new booking every time) without a session."""
+    if not session:
+        return None
+    return f"{session}|{' '.join(str(city).lower().split())}|{travel_date}"
+
+
+class BookingQueue:
+    def __init__(self, path=QUEUE_FILE, attempts=BOOKING_ATTEMPTS):
+        self.path = path
+        self.attempts = attempts
+        self.stats = {"enqueued": 0, "duplicates": 0, "requeued": 0, "booked": 0, "retried": 0, "failed": 0}
+        self._db = None
+        self._lock = threading.Lock()      # the chat threads enqueue, the worker thread books
+        self._wake = threading.Event()
+        self._worker = None
+
+    def _conn(self):
+        # open lazily, importing this module should not create files
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                reference TEXT PRIMARY KEY,
+                idempotency_key TEXT UNIQUE NOT NULL,
+                city TEXT NOT NULL,
+                travel_date TEXT NOT NULL,
+                details TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                event_id TEXT,
+                link TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL)""")
+            self._db.execute("CREATE INDEX IF NOT EXISTS jobs_due ON jobs (status, next_attempt_at)")
+            # the process stopped while these were being booked: book them again (the event id prevents doubles)
+            self._db.execute("UPDATE jobs SET status = ? WHERE status = ?", (QUEUED, BOOKING))
+            self._db.commit()
+        return self._db
+
+    def _job(self, where, value):
+        row = self._conn().execute(f"""SELECT reference, city, travel_date, status, attempts, link, error
+                                       FROM jobs WHERE {where} = ?""", (value,)).fetchone()
+        if row is None:
+            return None
+        return {"reference": row[0], "destination_city": row[1], "travel_date": row[2], "status": row[3],
+                "attempts": row[4], "link": row[5], "error": row[6]}
+
+    def enqueue(self, city, travel_date, key=None):
+        """Store the booking and return its job right away; the calendar event is made in the background."""
+        if not city:
+            raise ValueError("City not specified")
+        # a bad date is reported to the model now, not by the worker later
+        travel_date = datetime.date.fromisoformat(str(travel_date)).isoformat()
+        key = key or uuid.uuid4().hex
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        reference = "FA-" + digest[:8].upper()
+        details = dict(book.set_event_details(city, travel_date), event_id=digest[:32])
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            previous = self._job("idempotency_key", key)
+            # a new booking, or a failed one that is booked again: (re)queued; otherwise the existing job is the answer
+            db.execute("""INSERT INTO jobs (reference, idempotency_key, city, travel_date, details, status,
+                          next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                          ON CONFLICT (idempotency_key) DO UPDATE SET status = excluded.status, attempts = 0,
+                          next_attempt_at = excluded.next_attempt_at, error = NULL, updated_at = excluded.updated_at
+                          WHERE jobs.status = ?""",
+                       (reference, key, city, travel_date, json.dumps(details), QUEUED, now, now, now, FAILED))
+            db.commit()
+            if previous is None:
+                self.stats["enqueued"] += 1
+            else:
+                self.stats["requeued" if previous["status"] == FAILED else "duplicates"] += 1
+            job = self._job("idempotency_key", key)
+        self.start()
+        self._wake.set()
+        return job
+
+    def status(self, reference):
+        """The job of a booking reference, None when it is unknown."""
+        with self._lock:
+            return self._job("reference", str(reference or "").strip().upper())
+
+    def start(self):
+        """Start the worker (also books what was left from an earlier run)."""
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="booking-worker", daemon=True)
+                self._worker.start()
+
+    def _claim(self):
+        """Mark the due jobs as being booked; returns [(reference, attempts, details)]."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            rows = db.execute("""SELECT reference, attempts, details FROM jobs WHERE status = ? AND next_attempt_at <= ?
+                                 ORDER BY next_attempt_at LIMIT ?""", (QUEUED, now, book.BATCH_SIZE)).fetchall()
+            db.executemany("UPDATE jobs SET status = ?, updated_at = ? WHERE reference = ?",
+                           [(BOOKING, now, row[0]) for row in rows])
+            db.commit()
+        return [(reference, attempts, json.loads(details)) for reference, attempts, details in rows]
+
+    def _next_wait(self):
+        with self._lock:
+            row = self._conn().execute("SELECT MIN(next_attempt_at) FROM jobs WHERE status = ?", (QUEUED,)).fetchone()
+        if row[0] is None:
+            return POLL_SECONDS
+        return min(POLL_SECONDS, max(0.0, row[0] - time.time()))
+
+    def _book(self, jobs):
+        try:
+            # no retries in book_meetings: the queue tries again itself (with its own, longer backoff), so a job is
+            # not "booking" for minutes and its status shows the error in the meantime
+            results = book.book_meetings([details for _, _, details in jobs], retries=0)
+        except Exception as e:
+            # no calendar at all (credentials, network): every job is tried again later
+            results = [{"error": str(e), "status": None}] * len(jobs)
+        now = time.time()
+        updates = []
+        for (reference, attempts, _), result in zip(jobs, results):
+            attempts += 1
+            if "event" in result:
+                event = result["event"]
+                updates.append((BOOKED, attempts, now, event.get("id"), event.get("htmlLink"), None, now, reference))
+                self.stats["booked"] += 1
+                continue
+            temporary = result.get("status") is None or result.get("status") in book.RETRY_STATUSES
+            if temporary and attempts < self.attempts:
+                delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (attempts - 1))
+                updates.append((QUEUED, attempts, now + delay, None, None, result["error"], now, reference))
+                self.stats["retried"] += 1
+            else:
+                updates.append((FAILED, attempts, now, None, None, result["error"], now, reference))
+                self.stats["failed"] += 1
+        with self._lock:
+            db = self._conn()
+            db.executemany("""UPDATE jobs SET status = ?, attempts = ?, next_attempt_at = ?, event_id = ?, link = ?,
+                              error = ?, updated_at = ? WHERE reference = ?""", updates)
+            db.commit()
+
+    def _run(self):
+        while True:
+            # cleared before looking, so an enqueue from now on wakes the wait below
+            self._wake.clear()
+            jobs = self._claim()
+            if jobs:
+                self._book(jobs)
+            else:
+                self._wake.wait(self._next_wait())
+
+
+# one queue for the whole process
+booking_queue = BookingQueue()
@@ -0,0 +1,144 @@
+# coding: utf-8
+
+# Headless batch mode of CompanyBrochure.py: brochures for a whole list of companies.
+#
+#   python brochure_batch.py companies.csv --out brochures --workers 8 --rpm-gpt 300 --rpm-claude 50
+#
+# The csv needs the columns company,url,type,audience,tone,language,model (model is GPT or Claude).
+# - rows run in a pool of worker threads; their API calls go through the shared rate limiter (ratelimit.py)
+#   with batch priority, so someone using the Gradio app at the same time goes first
+# - every finished row is appended to <out>/checkpoint.jsonl; after a crash, running the same command
+#   again skips those rows and continues with the rest
+# - every brochure is written to <out>/<company>-<language>-<model>-<id>.md
+# - <out>/report.csv has the timing of every row, a summary is printed at the end
+#
+# To try it without real websites and API costs, see fixture_server.py and fake_llm_server.py, e.g.
+#   python fixture_server.py fixtures/site 8000 &
+#   python fake_llm_server.py 8001 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8001 python brochure_batch.py fixtures/companies.csv
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import CompanyBrochure
+import ratelimit
+
+COLUMNS = ["company", "url", "type", "audience", "tone", "language", "model"]
+
+
+def row_key(row):
+    """Id of a row: the same inputs give the same id, so a changed row is generated again."""
+    values = json.dumps([row[column] for column in COLUMNS])
+    return hashlib.sha256(values.encode("utf-8")).hexdigest()[:12]
+
+
+def output_name(row, key):
+    slug = re.sub(r"[^a-z0-9]+", "-", f"{row['company']}-{row['language']}-{row['model']}".lower()).strip("-")
+    return f"{slug}-{key}.md"
+
+
+def load_checkpoint(path):
+    done = {}
+    if os.path.exists(path):
+        with open(path, encoding="utf-8") as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[entry["key"]] = entry
+    return done
+
+
+def generate(row):
+    """Run one row through stream_model and return (brochure, seconds, seconds until the first output)."""
+    start = time.perf_counter()
+    first_output = None
+    brochure = ""
+    with ratelimit.priority(ratelimit.BATCH):
+        for brochure in CompanyBrochure.stream_model(row["company"], row["url"], row["type"], row["audience"],
+                                                     row["tone"], row["language"], row["model"]):
+            if first_output is None:
+                first_output = time.perf_counter() - start
+    return brochure, time.perf_counter() - start, first_output
+
+
+def run_batch(csv_path, out_dir, workers=4, rpm_gpt=None, rpm_claude=None):
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint_path = os.path.join(out_dir, "checkpoint.jsonl")
+    done = load_checkpoint(checkpoint_path)
+    with open(csv_path, newline="", encoding="utf-8") as file:
+        rows = [{column: (row.get(column) or "").strip() for column in COLUMNS} for row in csv.DictReader(file)]
+    todo = [row for row in rows if row_key(row) not in done]
+    print(f"{len(rows)} rows, {len(rows) - len(todo)} already done, {len(todo)} to generate with {workers} workers")
+
+    if rpm_gpt:
+        ratelimit.configure(CompanyBrochure.MODEL_GPT, rpm=rpm_gpt)
+    if rpm_claude:
+        ratelimit.configure(CompanyBrochure.MODEL_claude, rpm=rpm_claude)
+    checkpoint_lock = threading.Lock()
+    report = [{**row, "status": "skipped", **done[row_key(row)], "error": ""} for row in rows if row_key(row) in done]
+    batch_start = time.perf_counter()
+
+    def run(row):
+        key = row_key(row)
+        if row["model"] not in ("GPT", "Claude"):
+            raise ValueError(f"Unknown model {row['model']}")
+        brochure, seconds, first_output = generate(row)
+        name = output_name(row, key)
+        with open(os.path.join(out_dir, name), "w", encoding="utf-8") as out:
+            out.write(brochure)
+        entry = {"key": key, "output": name, "seconds": round(seconds, 3),
+                 "first_output_seconds": round(first_output or 0.0, 3)}
+        with checkpoint_lock:
+            with open(checkpoint_path, "a", encoding="utf-8") as checkpoint:
+                checkpoint.write(json.dumps(entry) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+        return entry
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run, row): row for row in todo}
+        for future in as_completed(futures):
+            row = futures[future]
+            try:
+                entry = future.result()
+                report.append({**row, "status": "ok", **entry, "error": ""})
+                print(f"done   {row['company']} ({row['language']}, {row['model']}) in {entry['seconds']:.1f}s")
+            except Exception as e:
+                report.append({**row, "status": "failed", "key": row_key(row), "output": "", "seconds": "",
+                               "first_output_seconds": "", "error": str(e)})
+                print(f"FAILED {row['company']} ({row['language']}, {row['model']}): {e}")
+    wall_time = time.perf_counter() - batch_start
+
+    report_path = os.path.join(out_dir, "report.csv")
+    fields = ["key"] + COLUMNS + ["status", "output", "seconds", "first_output_seconds", "error"]
+    with open(report_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(report)
+
+    times = sorted(entry["seconds"] for entry in report if entry["status"] == "ok")
+    failed = sum(1 for entry in report if entry["status"] == "failed")
+    print(f"\n{len(times)} generated, {failed} failed, {len(rows) - len(todo)} skipped in {wall_time:.1f}s")
+    if times:
+        print(f"per brochure: median {times[len(times) // 2]:.1f}s, max {times[-1]:.1f}s, "
+              f"sum {sum(times):.1f}s ({sum(times) / wall_time:.1f}x parallel)")
+    print(f"report: {report_path}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate brochures for all companies in a csv file.")
+    parser.add_argument("csv", help="csv with the columns " + ",".join(COLUMNS))
+    parser.add_argument("--out", default="brochures", help="folder for the brochures, checkpoint and report")
+    parser.add_argument("--workers", type=int, default=4, help="rows generated at the same time")
+    parser.add_argument("--rpm-gpt", type=int, help="max GPT requests per minute (default: see ratelimit.py)")
+    parser.add_argument("--rpm-claude", type=int, help="max Claude requests per minute (default: see ratelimit.py)")
+    args = parser.parse_args()
+    run_batch(args.csv, args.out, args.workers, args.rpm_gpt, args.rpm_claude)
@@ -2,9 +2,8 @@
 
 import os
 from dotenv import load_dotenv
-from openai import OpenAI
-import anthropic
-from IPython.display import Markdown, display, update_display
+from clients import openai_client, anthropic_client
+import ratelimit
 
 # import for google
 # in rare cases, this seems to give an error on some systems, or even crashes the kernel
@@ -41,8 +40,8 @@ else:
 
 # Connect to OpenAI, Anthropic
 
-openai = OpenAI()
-claude = anthropic.Anthropic()
+openai = openai_client()
+claude = anthropic_client()
 
 # Let's make a conversation between GPT-4o-mini and Claude-3-haiku
 # We're using cheap versions of models so the costs will be minimal
@@ -63,7 +62,7 @@ def call_gpt():
     for gpt, claude in zip(gpt_messages, claude_messages):
         messages.append({"role": "assistant", "content": gpt})
         messages.append({"role": "user", "content": claude})
-    completion = openai.chat.completions.create(
+    completion = ratelimit.call(gpt_model, openai.chat.completions.create,
         model=gpt_model,
         messages=messages
     )
@@ -75,7 +74,7 @@ def call_claude():
         messages.append({"role": "user", "content": gpt})
         messages.append({"role": "assistant", "content": claude_message})
     messages.append({"role": "user", "content": gpt_messages[-1]})
-    message = claude.messages.create(
+    message = ratelimit.call(claude_model, claude.messages.create,
         model=claude_model,
         system=claude_system,
         messages=messages,
@@ -0,0 +1,71 @@
+# coding: utf-8
+
+# One OpenAI and one Anthropic client for the whole process, instead of a new client per script or per chat turn.
+# All of them share a tuned HTTP connection pool, so a chat turn reuses a warm (keep-alive) TLS connection
+# instead of doing a new handshake:
+# - HTTP/2 when the h2 package is installed (pip install h2), otherwise HTTP/1.1 with keep-alive
+# - pool size and timeouts configurable with environment variables
+#
+#   from clients import openai_client, anthropic_client
+#   openai = openai_client()
+#
+# The async variants are for async code (e.g. Gradio async generators). An async client belongs to the
+# event loop it is first used on, so use them from one loop only (the Gradio server loop).
+#
+# The SDKs are only imported, and the clients only made, when a client is first used (see lazy.py): importing
+# openai and anthropic takes the better part of a second, and most apps only ever use one of the two.
+
+import importlib.util
+import os
+import threading
+
+from lazy import LazyObject, lazy_import
+
+anthropic = lazy_import("anthropic")
+httpx = lazy_import("httpx")
+openai = lazy_import("openai")
+
+HTTP2 = importlib.util.find_spec("h2") is not None
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 50))
+KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", 60))
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", 5))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", 120))     # between two chunks of a stream, not the whole answer
+
+_clients = {}
+_lock = threading.Lock()
+
+
+def _http_settings():
+    return dict(
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                            keepalive_expiry=KEEPALIVE_SECONDS),
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT),
+    )
+
+
+def _shared(name, build):
+    def get():
+        with _lock:
+            if name not in _clients:
+                _clients[name] = build()
+            return _clients[name]
+    return LazyObject(get)
+
+
+def openai_client():
+    return _shared("openai", lambda: openai.OpenAI(http_client=openai.DefaultHttpxClient(**_http_settings())))
+
+
+def anthropic_client():
+    return _shared("anthropic", lambda: anthropic.Anthropic(http_client=anthropic.DefaultHttpxClient(**_http_settings())))
+
+
+def async_openai_client():
+    return _shared("async_openai",
+                   lambda: openai.AsyncOpenAI(http_client=openai.DefaultAsyncHttpxClient(**_http_settings())))
+
+
+def async_anthropic_client():
+    return _shared("async_anthropic",
+                   lambda: anthropic.AsyncAnthropic(http_client=anthropic.DefaultAsyncHttpxClient(**_http_settings())))
@@ -0,0 +1,118 @@
+# coding: utf-8
+
+# Concurrent crawl engine for the brochure apps.
+# All pages of one brochure are downloaded at the same time instead of one after the other,
+# so preparing a brochure takes about as long as the slowest page instead of the sum of all pages.
+#
+# - one shared httpx.AsyncClient (= one connection pool, keep-alive) for the whole process
+# - at most PER_HOST_LIMIT requests in flight towards the same host
+# - a global timeout budget per crawl: pages that are not in by then are dropped
+# - pages go through the persistent page cache (pagecache.py), fresh pages are not requested at all
+# - bodies are streamed with the same size cap and content type check as Website (see website.py)
+#
+# The event loop runs in a background thread, so fetch_pages() can be called from plain
+# (sync) code: Gradio worker threads, scripts and notebooks that already run their own loop.
+
+import asyncio
+import threading
+from urllib.parse import urlsplit
+
+import httpx
+
+from pagecache import page_cache
+from website import CHUNK_SIZE, BodyReader, PageRegistry, Website, check_content_type, check_url, headers
+
+PER_HOST_LIMIT = 4          # max concurrent requests towards one host
+CRAWL_TIMEOUT = 20.0        # seconds for the complete crawl
+PAGE_TIMEOUT = 10.0         # seconds for a single page
+MAX_CONNECTIONS = 20        # size of the shared connection pool
+
+_loop = None
+_client = None
+_host_limits = {}
+_lock = threading.Lock()
+
+
+def _get_loop():
+    """Start (once) the background event loop and the shared http client living on it."""
+    global _loop, _client
+    with _lock:
+        if _loop is None:
+            loop = asyncio.new_event_loop()
+            threading.Thread(target=loop.run_forever, name="crawler-loop", daemon=True).start()
+
+            async def make_client():
+                return httpx.AsyncClient(
+                    headers=headers,
+                    follow_redirects=True,
+                    timeout=PAGE_TIMEOUT,
+                    limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+                )
+
+            _client = asyncio.run_coroutine_threadsafe(make_client(), loop).result()
+            _loop = loop
+    return _loop
+
+
+def _host_limit(url, per_host_limit):
+    # only called from the loop thread, so no locking needed
+    key = (urlsplit(url).netloc.lower(), per_host_limit)
+    if key not in _host_limits:
+        _host_limits[key] = asyncio.Semaphore(per_host_limit)
+    return _host_limits[key]
+
+
+async def _fetch(url, per_host_limit):
+    check_url(url)
+    body, validators = page_cache.lookup(url)
+    if body is not None:
+        return body
+    async with _host_limit(url, per_host_limit):
+        async with _client.stream("GET", url, headers=validators) as response:
+            body = b""
+            if response.status_code != 304:
+                check_content_type(url, response.headers)
+                reader = BodyReader()
+                async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                    if not reader.add(chunk):
+                        break
+                body = reader.body()
+        return page_cache.update(url, response.status_code, body, response.headers)
+
+
+async def crawl(urls, per_host_limit=PER_HOST_LIMIT, timeout=CRAWL_TIMEOUT):
+    """Download all urls concurrently, returns {url: body} for the pages that made it in time."""
+    tasks = {url: asyncio.ensure_future(_fetch(url, per_host_limit)) for url in dict.fromkeys(urls)}
+    if not tasks:
+        return {}
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for task in pending:
+        task.cancel()
+
+    bodies = {}
+    for url, task in tasks.items():
+        if task in pending:
+            print(f"Crawl timeout, skipping {url}")
+        elif task.exception() is not None:
+            print(f"Could not fetch {url}: {task.exception()}")
+        else:
+            bodies[url] = task.result()
+    return bodies
+
+
+def fetch_pages(urls, per_host_limit=PER_HOST_LIMIT, timeout=CRAWL_TIMEOUT, registry=None):
+    """Sync entry point: crawl the urls concurrently and return {url: Website}.
+
+    When a PageRegistry is passed, pages already in it are not downloaded again
+    and the freshly crawled pages are added to it.
+    """
+    if registry is None:
+        registry = PageRegistry()
+    missing = [url for url in urls if url not in registry]
+    if missing:
+        loop = _get_loop()
+        bodies = asyncio.run_coroutine_threadsafe(crawl(missing, per_host_limit, timeout), loop).result()
+        # parsing is CPU work, do it here in the caller's thread and keep the loop free for I/O
+        for url, body in bodies.items():
+            registry.add(Website(url, body))
+    return {url: registry.pages[url] for url in urls if url in registry}
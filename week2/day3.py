@@ -4,16 +4,25 @@
 
 
 # imports
-import os
+import asyncio
 from dotenv import load_dotenv
-from openai import OpenAI
+from clients import openai_client, anthropic_client, async_openai_client, async_anthropic_client
 import gradio as gr
-import anthropic
+from lazy import lazy_import
 from load_api_keys import load_api_keys
-from typing import Generator, Dict, List
-
-openai = OpenAI()
-claude = anthropic.Anthropic()
+import ratelimit
+from streaming import coalesce, coalesce_async
+from history import history_manager, summary_message
+from semanticcache import semantic_cache
+from promptcache import STREAM_USAGE, openai_pieces, openai_pieces_async, report_anthropic, system_blocks
+from typing import AsyncGenerator, Generator, Dict, List
+
+anthropic = lazy_import("anthropic")    # only for anthropic.APIError, imported when the Claude chat is used
+
+openai = openai_client()
+claude = anthropic_client()
+aopenai = async_openai_client()
+aclaude = async_anthropic_client()
 gpt_model = "gpt-4o-mini"
 claude_model = "claude-3-haiku-20240307"
 model_type = "Claude"
@@ -36,20 +45,34 @@ Encourage the customer to buy hats if they are unsure what to get."
 system_message += "\nIf the customer asks for shoes, you should respond that shoes are not on sale today, \
 but remind the customer to look at hats!"
 
+# notes that only apply to one turn go after the history instead of into the system message,
+# so the system message is the same on every turn and stays in the provider's prompt cache (see promptcache.py)
+def turn_note(message):
+    if 'belt' in message.lower():
+        return "The store does not sell belts; if you are asked for belts, be sure to point out other items on sale."
+    return None
+
+# namespace of this bot in the semantic cache: the answers of the clothes store persona
+CACHE_NAMESPACE = f"clothes-store/{gpt_model}"
+
 def chat_gpt(message, history):
+    # a question asked before (or one very like it) is answered from the semantic cache, see semanticcache.py
+    cached = semantic_cache.get(CACHE_NAMESPACE, message, history)
+    if cached is not None:
+        yield cached
+        return
 
-    relevant_system_message = system_message
-    if 'belt' in message:
-        relevant_system_message += " The store does not sell belts; if you are asked for belts, be sure to point out other items on sale."
-    
-    messages = [{"role": "system", "content": relevant_system_message}] + history + [{"role": "user", "content": message}]
+    # the last turns verbatim, the older ones as a summary (see history.py)
+    messages = history_manager.messages(system_message, history, message, turn_note(message))
 
-    stream = openai.chat.completions.create(model=gpt_model, messages=messages, stream=True)
+    stream = ratelimit.call(gpt_model, openai.chat.completions.create, model=gpt_model, messages=messages, stream=True,
+                            stream_options=STREAM_USAGE)
 
-    response = ""
-    for chunk in stream:
-        response += chunk.choices[0].delta.content or ''
+    # the answer so far every few tokens instead of after every token, see streaming.py
+    response = None
+    for response in coalesce(openai_pieces(stream, "Clothes store")):
         yield response
+    semantic_cache.put(CACHE_NAMESPACE, message, response, history)
 
 def chat_claude(message, history):
     relevant_system_message = system_message
@@ -79,9 +102,6 @@ def chat_claude(message, history):
     print("Claude responds:")
     print(f"Streaming {messages}")
 
-    # Initialize the Claude client
-    client = anthropic.Client(api_key=os.getenv("ANTHROPIC_API_KEY"))  # Replace with your API key if not using environment variables
-
     # Send the prompt to Claude and stream the response
     result = claude.messages.stream(
         model=claude_model,
@@ -127,17 +147,14 @@ def chat_claude2(
         formatted_messages.append(f"Human: {message}")
         
         # Stream response
-        response = ""
-        with client.messages.stream(
+        with ratelimit.stream(claude_model, claude.messages.stream,
             model=claude_model,
             max_tokens=1000,
             temperature=0.7,
             system=system_message,
             messages="\n\n".join(formatted_messages)
         ) as stream:
-            for chunk in stream.text_stream:
-                response += chunk or ""
-                yield response
+            yield from coalesce(stream.text_stream)
                 
     except anthropic.APIError as e:
         yield f"API Error: {str(e)}"
@@ -149,10 +166,63 @@ def chat_claude2(
         response += chunk["completion"] or ""
         yield response
 
-if model_type == "Claude":
-    gr.ChatInterface(fn=chat_claude2, type="messages").launch()
-else: 
-    gr.ChatInterface(fn=chat_gpt, type="messages").launch()
+# async versions for Gradio: an open chat stream is a coroutine on the event loop instead of a worker thread,
+# so one process can serve many chats at the same time
+async def chat_gpt_async(message, history):
+    cached = await asyncio.to_thread(semantic_cache.get, CACHE_NAMESPACE, message, history)
+    if cached is not None:
+        yield cached
+        return
+
+    messages = await asyncio.to_thread(history_manager.messages, system_message, history, message, turn_note(message))
+
+    stream = await ratelimit.call_async(gpt_model, aopenai.chat.completions.create, model=gpt_model, messages=messages, stream=True,
+                                        stream_options=STREAM_USAGE)
+
+    response = None
+    async for response in coalesce_async(openai_pieces_async(stream, "Clothes store")):
+        yield response
+    await asyncio.to_thread(semantic_cache.put, CACHE_NAMESPACE, message, response, history)
+
+async def chat_claude2_async(
+    message: str,
+    history: List[Dict[str, str]],
+    system_message: str = system_message
+) -> AsyncGenerator[str, None]:
+    """
+    Async version of chat_claude2, the history is passed to Claude as a list of messages.
+    """
+    try:
+        for msg in history:
+            if not isinstance(msg, dict) or 'role' not in msg or 'content' not in msg:
+                raise ValueError("Invalid message format in history")
+        summary, messages = await asyncio.to_thread(history_manager.compact, history)
+        messages.append({"role": "user", "content": message})
+        # the static system message is marked for Claude's prompt cache, the summary and note come after it
+        system = system_blocks(system_message, summary and summary_message(summary), turn_note(message))
+
+        async with ratelimit.stream_async(claude_model, aclaude.messages.stream,
+            model=claude_model,
+            max_tokens=1000,
+            temperature=0.7,
+            system=system,
+            messages=messages
+        ) as stream:
+            async for response in coalesce_async(stream.text_stream):
+                yield response
+            report_anthropic((await stream.get_final_message()).usage, "Clothes store")
+
+    except anthropic.APIError as e:
+        yield f"API Error: {str(e)}"
+    except Exception as e:
+        yield f"Error: {str(e)}"
+
+# concurrency_limit=None: async handlers, no need to make users wait for each other (gradio's default is 1 at a time)
+if __name__ == "__main__":
+    if model_type == "Claude":
+        gr.ChatInterface(fn=chat_claude2_async, type="messages", concurrency_limit=None).launch()
+    else: 
+        gr.ChatInterface(fn=chat_gpt_async, type="messages", concurrency_limit=None).launch()
 
 
 
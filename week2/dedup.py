@@ -0,0 +1,44 @@
+# coding: utf-8
+
+# Removes the text that company sites repeat on every page (header, navigation, footer, cookie banner)
+# before it goes into the brochure prompt.
+# Every line of a page gets a fingerprint; a line whose fingerprint was already seen on an earlier page
+# of the same brochure run is dropped. The first page (usually the landing page) keeps its copy,
+# so the navigation still shows up once, the following pages only bring their own content.
+# Only the lines that really went into the prompt count as seen (remember()): a line that the token budget
+# cut from the landing page is kept when it shows up again on a later page.
+#
+#   kept = assembler.add("About", "about", page.get_contents(deduplicator.filter(page.text)))
+#   deduplicator.remember(kept)
+
+import hashlib
+import re
+
+_spaces = re.compile(r"\s+")
+
+
+def fingerprint(line):
+    # case and whitespace differences should not make boilerplate look new
+    normalized = _spaces.sub(" ", line).strip().casefold()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest()
+
+
+class Deduplicator:         ## one per brochure run, feed the pages in the order they go into the prompt
+    def __init__(self):
+        self.seen = set()
+        self.lines_dropped = 0
+
+    def filter(self, text):
+        """Return text without the lines that were on an earlier page."""
+        kept = []
+        for line in text.split("\n"):
+            if fingerprint(line) in self.seen:
+                self.lines_dropped += 1
+                continue
+            kept.append(line)
+        return "\n".join(kept)
+
+    def remember(self, text):
+        """Mark the lines of text (what went into the prompt) as seen for the following pages."""
+        # only after the whole page: repeats within one page are real content (lists, tables)
+        self.seen.update(fingerprint(line) for line in text.split("\n"))
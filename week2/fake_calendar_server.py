@@ -0,0 +1,147 @@
+# coding: utf-8
+
+# Local stand-in for the Google Calendar API, to try out the bookings (bookagenda.py) without a Google account.
+# It answers
+#   POST /calendar/v3/calendars/<calendar>/events   (events.insert, returns the event with an id and htmlLink)
+#   POST /batch/calendar/v3                         (a multipart/mixed batch of events.insert requests)
+#   POST /token                                     (OAuth token refresh, a new access token valid for an hour)
+# with an optional delay per request, and counts the requests it got in server.stats.
+# An event with an id that was inserted before gets a 409, an event that ends before it starts a 400, and with
+# fail_rate that fraction of the inserts gets a 503 (to try out retries).
+#
+#   python fake_calendar_server.py 8002 0.2 token.json 0.1    (port, delay, token file to write, fail rate)
+#   CALENDAR_API_ENDPOINT=http://127.0.0.1:8002/calendar/v3/ CALENDAR_TOKEN_URI=http://127.0.0.1:8002/token python MultiAgent.py
+#
+# or from code: server, base_url = start_fake_calendar_server(delay=0.2); write_token_file("token.json", base_url)
+
+import datetime
+import email.parser
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeCalendarHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True      # headers and body are separate writes, do not wait for the ACK between them
+    delay = 0.0
+    fail_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(self.delay)
+        stats = self.server.stats
+        if self.path.split("?")[0] == "/token":
+            with self.server.lock:
+                stats["token_refreshes"] += 1
+            self._json({"access_token": f"fake-token-{next(self.server.ids)}", "expires_in": 3600, "token_type": "Bearer"})
+        elif self.path.startswith("/calendar/v3/calendars/") and self.path.split("?")[0].endswith("/events"):
+            self._json(*self._insert(json.loads(body or b"{}")))
+        elif self.path.split("?")[0] == "/batch/calendar/v3":
+            with self.server.lock:
+                stats["batches"] += 1
+            self._batch(body)
+        else:
+            self.send_error(404)
+
+    def _insert(self, event):
+        """(payload, status) of an events.insert."""
+        with self.server.lock:
+            self.server.stats["inserts"] += 1
+            if random.random() < self.fail_rate:
+                return self._error(503, "Service unavailable, try again.", "backendError")
+            if event.get("end", {}).get("dateTime", "") < event.get("start", {}).get("dateTime", ""):
+                return self._error(400, "The specified time range is empty.", "timeRangeEmpty")
+            event_id = event.get("id") or f"event{next(self.server.ids)}"
+            if event_id in self.server.events:
+                return self._error(409, "The requested identifier already exists.", "duplicate")
+            self.server.events[event_id] = event
+        return dict(event, id=event_id, status="confirmed",
+                    htmlLink=f"http://{self.headers.get('Host')}/calendar/event?eid={event_id}"), 200
+
+    def _error(self, status, message, reason):
+        return {"error": {"code": status, "message": message, "errors": [{"reason": reason, "message": message}]}}, status
+
+    def _batch(self, body):
+        # every part is a complete http request, the answer has a part with a complete http response for each
+        message = email.parser.BytesParser().parsebytes(
+            b"Content-Type: " + self.headers["Content-Type"].encode() + b"\r\n\r\n" + body)
+        boundary = f"batch_{next(self.server.ids)}"
+        parts = []
+        for part in message.get_payload():
+            request = part.get_payload(decode=True).decode("utf-8").replace("\r\n", "\n")
+            _, _, request_body = request.partition("\n\n")
+            payload, status = self._insert(json.loads(request_body or "{}"))
+            content_id = part["Content-ID"].replace("<", "<response-", 1)
+            parts.append(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: {content_id}\r\n\r\n"
+                         f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+                         f"Content-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n")
+        body = ("".join(parts) + f"--{boundary}--\r\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", f"multipart/mixed; boundary={boundary}")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _json(self, payload, status=200):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeCalendarServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.stats = {"inserts": 0, "batches": 0, "token_refreshes": 0}
+        self.events = {}
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+
+    def handle_error(self, request, client_address):
+        pass
+
+
+def start_fake_calendar_server(port=0, delay=0.0, fail_rate=0.0):
+    """Start the fake server in a background thread, returns (server, base_url)."""
+    handler = type("ConfiguredFakeCalendarHandler", (FakeCalendarHandler,), {"delay": delay, "fail_rate": fail_rate})
+    server = FakeCalendarServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def write_token_file(path, base_url, expires_in=3600):
+    """A token.json whose token is refreshed at the fake server."""
+    expiry = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=expires_in)
+    with open(path, "w") as file:
+        json.dump({"token": "fake-token-0", "refresh_token": "fake-refresh-token", "token_uri": f"{base_url}/token",
+                   "client_id": "fake-client", "client_secret": "fake-secret",
+                   "scopes": ["https://www.googleapis.com/auth/calendar"],
+                   "expiry": expiry.strftime("%Y-%m-%dT%H:%M:%S.%fZ")}, file)
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8002
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    fail_rate = float(sys.argv[4]) if len(sys.argv) > 4 else 0.0
+    server, base_url = start_fake_calendar_server(port, delay, fail_rate)
+    if len(sys.argv) > 3:
+        write_token_file(sys.argv[3], base_url)
+    print(f"Fake calendar server on {base_url}: CALENDAR_API_ENDPOINT={base_url}/calendar/v3/ CALENDAR_TOKEN_URI={base_url}/token")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        print(server.stats)
+        server.shutdown()
@@ -0,0 +1,141 @@
+# coding: utf-8
+
+# Fake OpenAI / Anthropic server, to run the apps and batch jobs end-to-end without spending on real API calls.
+# It answers
+#   POST /v1/chat/completions   (OpenAI, streaming and non streaming, json mode returns {"links": []})
+#   POST /v1/messages           (Anthropic, streaming and non streaming)
+# with a canned markdown text, sent word by word with a configurable delay.
+#
+#   python fake_llm_server.py 8001 0.01 0.2       (port, delay between words, delay before the first word)
+#   OPENAI_BASE_URL=http://127.0.0.1:8001/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8001 python brochure_batch.py companies.csv
+#
+# or from code: server, base_url = start_fake_llm_server(delay=0.01)
+
+import json
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = ("# Acme Tools\n\nAcme Tools builds **connected power tools** for professional workshops. "
+          "Founded in 1987 in Kortrijk, the company designs and assembles every tool in Belgium.\n\n"
+          "## Customers\n\nMore than 3,000 workshops rely on Acme Tools.\n\n"
+          "## Careers\n\nAcme is hiring engineers and technicians. Join us!\n")
+
+
+class FakeLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    delay = 0.0             # seconds between two streamed words
+    first_token_delay = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        words = [word + " " for word in ANSWER.split(" ")]
+        if self.path.endswith("/chat/completions"):
+            if (request.get("response_format") or {}).get("type") == "json_object":
+                words = ['{"links": []}']
+            if request.get("stream"):
+                self._stream(self._openai_events(request, words))
+            else:
+                self._json(self._openai_completion(request, "".join(words)))
+        elif self.path.endswith("/messages"):
+            if request.get("stream"):
+                self._stream(self._anthropic_events(request, words))
+            else:
+                self._json(self._anthropic_message(request, "".join(words)))
+        else:
+            self.send_error(404)
+
+    def _json(self, payload):
+        time.sleep(self.first_token_delay)
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.first_token_delay)
+        for event in events:
+            data = event.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+            self.wfile.flush()
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _openai_completion(self, request, text):
+        return {"id": "chatcmpl-fake", "object": "chat.completion", "created": int(time.time()),
+                "model": request.get("model", "fake"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 100, "completion_tokens": len(text.split()), "total_tokens": 100 + len(text.split())}}
+
+    def _openai_events(self, request, words):
+        for word in words:
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "fake"),
+                     "choices": [{"index": 0, "delta": {"role": "assistant", "content": word}, "finish_reason": None}]}
+            yield f"data: {json.dumps(chunk)}\n\n"
+            time.sleep(self.delay)
+        if (request.get("stream_options") or {}).get("include_usage"):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                     "model": request.get("model", "fake"), "choices": [],
+                     "usage": {"prompt_tokens": 100, "completion_tokens": len(words), "total_tokens": 100 + len(words),
+                               "prompt_tokens_details": {"cached_tokens": 0}}}
+            yield f"data: {json.dumps(chunk)}\n\n"
+        yield "data: [DONE]\n\n"
+
+    def _anthropic_message(self, request, text):
+        return {"id": "msg_fake", "type": "message", "role": "assistant", "model": request.get("model", "fake"),
+                "content": [{"type": "text", "text": text}], "stop_reason": "end_turn", "stop_sequence": None,
+                "usage": {"input_tokens": 100, "output_tokens": len(text.split())}}
+
+    def _anthropic_events(self, request, words):
+        def event(name, data):
+            return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+        message = self._anthropic_message(request, "")
+        message["content"], message["stop_reason"] = [], None
+        yield event("message_start", {"type": "message_start", "message": message})
+        yield event("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+        for word in words:
+            yield event("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": word}})
+            time.sleep(self.delay)
+        yield event("content_block_stop", {"type": "content_block_stop", "index": 0})
+        yield event("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                      "usage": {"output_tokens": len(words)}})
+        yield event("message_stop", {"type": "message_stop"})
+
+
+class FakeLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024       # listen backlog, the default of 5 makes load tests wait for dropped connects
+
+    def handle_error(self, request, client_address):
+        pass        # clients hang up on kept-alive connections and streams all the time, that is fine here
+
+
+def start_fake_llm_server(port=0, delay=0.0, first_token_delay=0.0):
+    """Start the fake server in a background thread, returns (server, base_url)."""
+    handler = type("ConfiguredFakeLLMHandler", (FakeLLMHandler,), {"delay": delay, "first_token_delay": first_token_delay})
+    server = FakeLLMServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 8001
+    delay = float(sys.argv[2]) if len(sys.argv) > 2 else 0.0
+    first_token_delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, base_url = start_fake_llm_server(port, delay, first_token_delay)
+    print(f"Fake LLM server on {base_url}: OPENAI_BASE_URL={base_url}/v1 ANTHROPIC_BASE_URL={base_url}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,44 @@
+# coding: utf-8
+
+# Run several streaming generators (e.g. one brochure per language) at the same time.
+# Every generator runs in its own thread; fan_out yields the latest value of all of them
+# whenever one of them has something new, which is what a Gradio interface with several outputs expects.
+
+import queue
+import threading
+
+_DONE = object()
+
+
+def fan_out(generators):
+    """Consume the generators in parallel, yields the list of their latest values after every update."""
+    updates = queue.Queue()
+    latest = [""] * len(generators)
+
+    def run(index, generator):
+        try:
+            for value in generator:
+                updates.put((index, value))
+        except Exception as e:
+            updates.put((index, f"Error: {str(e)}"))
+        finally:
+            updates.put((index, _DONE))
+
+    for index, generator in enumerate(generators):
+        threading.Thread(target=run, args=(index, generator), daemon=True).start()
+
+    running = len(generators)
+    while running:
+        pending = [updates.get()]
+        # take everything that queued up in the meantime, one update to the UI is enough for it
+        while True:
+            try:
+                pending.append(updates.get_nowait())
+            except queue.Empty:
+                break
+        for index, value in pending:
+            if value is _DONE:
+                running -= 1
+            else:
+                latest[index] = value
+        yield list(latest)
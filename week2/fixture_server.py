@@ -0,0 +1,51 @@
+# coding: utf-8
+
+# Small local HTTP server to try out the crawler without hitting real company websites.
+# It serves the html files of a folder, optionally with an artificial delay per request,
+# so you can see that crawling N pages takes about one delay instead of N delays.
+#
+#   python fixture_server.py fixtures/site 8000 0.5
+#
+# or from code:
+#   server, base_url = start_fixture_server("fixtures/site", delay=0.5)
+#   ... fetch_pages([base_url + "/about.html", base_url + "/careers.html"])
+#   server.shutdown()
+
+import functools
+import sys
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FixtureHandler(SimpleHTTPRequestHandler):
+    delay = 0.0
+
+    def do_GET(self):
+        if self.delay:
+            time.sleep(self.delay)
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass        # keep the console quiet
+
+
+def start_fixture_server(directory, port=0, delay=0.0):
+    """Serve directory on localhost in a background thread, returns (server, base_url)."""
+    handler = type("DelayedFixtureHandler", (FixtureHandler,), {"delay": delay})
+    server = ThreadingHTTPServer(("127.0.0.1", port), functools.partial(handler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    directory = sys.argv[1] if len(sys.argv) > 1 else "."
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+    delay = float(sys.argv[3]) if len(sys.argv) > 3 else 0.0
+    server, base_url = start_fixture_server(directory, port, delay)
+    print(f"Serving {directory} on {base_url} (delay {delay}s), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        server.shutdown()
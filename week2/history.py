@@ -0,0 +1,142 @@
+# coding: utf-8
+
+# Keep the chat history that is sent with every turn at a flat size.
+# Gradio hands the chat functions the complete conversation on every turn; sending all of it makes
+# every turn of a long support conversation more expensive and slower than the previous one.
+# The HistoryManager sends instead
+# - the last HISTORY_TURNS turns (user message + answer) verbatim
+# - everything before that as a short running summary, made by GPT
+# - and drops verbatim turns (into the summary) when the history would go over HISTORY_BUDGET tokens
+#
+#   messages = history_manager.messages(system_message, history, message)
+#
+# The system message stays the first message, unchanged, so the provider's prompt cache can reuse it (see promptcache.py).
+#
+# The summary is refreshed incrementally: the summary of the older part of a conversation is kept (keyed by a hash
+# of the messages it covers), and only the turns that roll out of the verbatim window are added to it.
+# Turns roll out SUMMARY_STEP at a time, so there is only a summary call every few turns, not on every turn.
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+import ratelimit
+from clients import openai_client
+from prompt_budget import count_tokens
+
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", 6))          # turns always sent verbatim
+SUMMARY_STEP = int(os.getenv("HISTORY_SUMMARY_STEP", 4))    # extra turns kept verbatim before they are summarized
+HISTORY_BUDGET = int(os.getenv("HISTORY_BUDGET", 3000))     # tokens for summary + verbatim history per request
+SUMMARY_TOKENS = 300
+SUMMARY_MODEL = "gpt-4o-mini"
+MAX_SUMMARIES = 1000
+
+summary_prompt = (
+    "You keep a running summary of a conversation between a user and an assistant. "
+    "Update the summary with the new messages. Keep names, numbers, dates, decisions and open questions; "
+    f"leave out small talk. Answer with the summary only, at most {SUMMARY_TOKENS} tokens."
+)
+
+
+def clean(history):
+    """Only role and content of the Gradio history (it also holds metadata the APIs do not accept)."""
+    return [{"role": msg["role"], "content": msg["content"] if isinstance(msg["content"], str) else str(msg["content"])}
+            for msg in history]
+
+
+def summary_message(summary):
+    return f"Summary of the earlier conversation:\n{summary}"
+
+
+def turn_starts(history):
+    """Indexes of the user messages, every turn starts with one."""
+    return [i for i, msg in enumerate(history) if msg["role"] == "user"]
+
+
+def _chain(history):
+    """Hash of history[:n] for every n, so a summary can be found back for the part of the conversation it covers."""
+    hashes = [b""]
+    for msg in history:
+        hashes.append(hashlib.blake2b(hashes[-1] + json.dumps(msg, sort_keys=True).encode("utf-8"), digest_size=16).digest())
+    return hashes
+
+
+class HistoryManager:
+    def __init__(self, keep_turns=HISTORY_TURNS, budget=HISTORY_BUDGET, step=SUMMARY_STEP):
+        self.keep_turns = keep_turns
+        self.budget = budget
+        self.step = step
+        self.summaries = OrderedDict()      # hash of the summarized messages -> summary, oldest use first
+        self.stats = {"summaries": 0, "turns_summarized": 0}
+        self._lock = threading.Lock()
+
+    def _summarize(self, summary, messages):
+        transcript = "\n".join(f"{msg['role']}: {msg['content']}" for msg in messages)
+        prompt = f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"
+        try:
+            response = ratelimit.call(SUMMARY_MODEL, openai_client().chat.completions.create,
+                model=SUMMARY_MODEL,
+                messages=[{"role": "system", "content": summary_prompt}, {"role": "user", "content": prompt}],
+                max_tokens=SUMMARY_TOKENS
+            )
+            return response.choices[0].message.content
+        except Exception as e:
+            # better an outdated summary than a failing chat
+            print(f"Could not update the conversation summary: {e}")
+            return summary
+
+    def _summary_of(self, history, end, hashes):
+        """Summary of history[:end], starting from the longest part of it that was summarized before."""
+        with self._lock:
+            start = next((n for n in range(end, 0, -1) if hashes[n] in self.summaries), 0)
+            summary = self.summaries.get(hashes[start], "")
+            if start:
+                self.summaries.move_to_end(hashes[start])
+        if start == end:
+            return summary
+        summary = self._summarize(summary, history[start:end])
+        with self._lock:
+            self.summaries[hashes[end]] = summary
+            while len(self.summaries) > MAX_SUMMARIES:
+                self.summaries.popitem(last=False)
+            self.stats["summaries"] += 1
+            self.stats["turns_summarized"] += sum(1 for msg in history[start:end] if msg["role"] == "user")
+        return summary
+
+    def compact(self, history, reserved=0):
+        """(summary of the older turns, the recent messages verbatim) for a Gradio history.
+
+        reserved: tokens of the budget already taken by the rest of the request (the new message)."""
+        history = clean(history)
+        starts = turn_starts(history)
+        # roll out whole turns, step at a time, so between keep_turns and keep_turns + step - 1 turns stay verbatim;
+        # and more turns while over the budget (counting the summary at its maximum size)
+        split = max(0, (len(starts) - self.keep_turns) // self.step * self.step)
+
+        def end_of(split):
+            return 0 if split == 0 else starts[split] if split < len(starts) else len(history)
+
+        while split < len(starts) and \
+                count_tokens(json.dumps(history[end_of(split):])) + (SUMMARY_TOKENS if split else 0) + reserved > self.budget:
+            split += 1
+        end = end_of(split)
+        summary = self._summary_of(history, end, _chain(history)) if end else ""
+        return summary, history[end:]
+
+    def messages(self, system_message, history, message, note=None):
+        """The OpenAI messages of a chat turn: system message, summary of the older turns, recent turns,
+        an optional extra system note for this turn only, new message."""
+        summary, recent = self.compact(history, count_tokens(message) + count_tokens(note or ""))
+        messages = [{"role": "system", "content": system_message}]
+        if summary:
+            messages.append({"role": "system", "content": summary_message(summary)})
+        messages += recent
+        if note:
+            messages.append({"role": "system", "content": note})
+        return messages + [{"role": "user", "content": message}]
+
+
+# one manager for the whole process, all chats share the summary cache
+history_manager = HistoryManager()
@@ -0,0 +1,47 @@
+# coding: utf-8
+
+# Lazy imports for the apps: the provider SDKs and media libraries take a large part of the start-up time
+# (see bench_imports.py), while a session may never use them.
+#
+#   anthropic = lazy_import("anthropic")     # imported on the first attribute access (anthropic.APIError)
+#   openai = LazyObject(make_client)         # make_client() is called on the first attribute access
+#
+# Libraries only one function needs (pydub, PIL, bs4) are simply imported inside that function.
+
+import importlib.util
+import sys
+import threading
+
+
+def lazy_import(name):
+    """The module, imported when one of its attributes is first used. Already imported modules are returned as is."""
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        raise ModuleNotFoundError(f"No module named '{name}'", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class LazyObject:
+    """Stands in for the object build() returns, build() is called (once) on the first attribute access."""
+
+    def __init__(self, build):
+        self._build = build
+        self._object = None
+        self._lock = threading.Lock()
+
+    def _get(self):
+        if self._object is None:
+            with self._lock:
+                if self._object is None:
+                    self._object = self._build()
+        return self._object
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
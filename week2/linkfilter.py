@@ -0,0 +1,116 @@
+# coding: utf-8
+
+# Local pre-filter for the links of a landing page, in front of the get_links LLM call.
+#
+# 1. candidate_links: make every href absolute, normalize and de-duplicate it, and drop what is never
+#    useful for a brochure: anchors, mailto/tel/javascript, other domains, files, legal and account pages
+# 2. pick_links: rank the candidates on keywords in their path (english, dutch and french sites);
+#    when an about page is found the choice is clear and no LLM call is needed at all
+# 3. otherwise the LLM decides from the (much shorter) candidate list, and its answer is kept
+#    per domain so the next brochure for the same company skips the call (cached_links / store_links)
+
+import os
+import re
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from pagecache import page_cache
+from website import BINARY_EXTENSIONS
+
+LINK_CACHE_TTL = float(os.getenv("LINK_CACHE_TTL", 7 * 24 * 3600))
+MAX_CANDIDATES = 60         # links sent to the LLM when it still has to decide
+MAX_PER_TYPE = 2
+
+# path keywords per link type, the order of the types is the order of importance
+LINK_KEYWORDS = {
+    "about page": ("about", "over-ons", "overons", "wie-zijn-wij", "who-we-are", "company", "bedrijf",
+                   "a-propos", "qui-sommes-nous", "entreprise", "history", "mission", "team"),
+    "customers page": ("customers", "customer", "clients", "klanten", "cases", "case-studies", "references",
+                       "referenties", "testimonials", "success"),
+    "products page": ("products", "producten", "services", "diensten", "solutions", "oplossingen", "produits"),
+    "careers page": ("careers", "career", "jobs", "job", "vacatures", "vacature", "werken-bij", "join-us",
+                     "emplois", "carrieres", "recrutement"),
+}
+
+SKIP_SCHEMES = ("mailto:", "tel:", "javascript:", "data:", "sms:", "whatsapp:")
+SKIP_WORDS = {"privacy", "privacy-policy", "terms", "cookie", "cookies", "legal", "disclaimer", "gdpr", "voorwaarden",
+              "conditions", "legales", "login", "log-in", "signin", "sign-in", "register", "account", "cart",
+              "checkout", "winkelmand", "search", "zoeken", "sitemap", "rss", "feed", "wp-admin", "wp-json"}
+_split_words = re.compile(r"[/_.\-]+")
+
+
+def _host(url):
+    host = urlsplit(url).hostname or ""
+    return host[4:] if host.startswith("www.") else host
+
+
+def normalize(url):
+    """Lowercase scheme and host, no fragment, no tracking parameters, no trailing slash."""
+    parts = urlsplit(url)
+    query = urlencode([(k, v) for k, v in parse_qsl(parts.query) if not k.startswith("utm_")])
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, query, ""))
+
+
+def candidate_links(website):
+    """Absolute, normalized, unique links of the page that could be worth a look for a brochure."""
+    base_host = _host(website.url)
+    landing = normalize(website.url)
+    candidates = []
+    seen = set()            # www.acme.be/about and acme.be/about are the same page
+    for href in website.links:
+        href = href.strip()
+        if not href or href.startswith("#") or href.lower().startswith(SKIP_SCHEMES):
+            continue
+        url = normalize(urljoin(website.url, href))
+        host = _host(url)
+        if not url.startswith(("http://", "https://")) or url == landing:
+            continue
+        if host != base_host and not host.endswith("." + base_host):
+            continue        # other domain (social media, partners...)
+        path = urlsplit(url).path.lower()
+        segments, words = _words(path)
+        if path.endswith(BINARY_EXTENSIONS) or SKIP_WORDS.intersection(segments + words):
+            continue
+        key = (host, urlsplit(url).path, urlsplit(url).query)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(url)
+    return candidates
+
+
+def _words(path):
+    # the path segments themselves ("over-ons") and the words in them ("over", "ons")
+    segments = [segment for segment in path.lower().split("/") if segment]
+    return segments, [word for word in _split_words.split(path.lower()) if word]
+
+
+def _score(url, keywords):
+    """0 when no keyword in the path, higher for a keyword early in a short path."""
+    segments, words = _words(urlsplit(url).path)
+    for position, segment in enumerate(segments):
+        if segment in keywords or any(word in keywords for word in _split_words.split(segment)):
+            return 100 - 10 * position - len(words)
+    return 0
+
+
+def pick_links(candidates):
+    """Pick the links by their path; returns the get_links json, or None when it is not clear enough."""
+    if not candidates:
+        return {"links": []}        # nothing left to ask the LLM about
+    links = []
+    for link_type, keywords in LINK_KEYWORDS.items():
+        scored = sorted(((_score(url, keywords), url) for url in candidates), key=lambda x: -x[0])
+        for score, url in scored[:MAX_PER_TYPE]:
+            if score > 0 and url not in [link["url"] for link in links]:
+                links.append({"type": link_type, "url": url})
+    if not any(link["type"] == "about page" for link in links):
+        return None
+    return {"links": links}
+
+
+def cached_links(url, mtype):
+    return page_cache.get_json(f"links:{_host(url)}:{mtype}", LINK_CACHE_TTL)
+
+
+def store_links(url, mtype, links):
+    page_cache.set_json(f"links:{_host(url)}:{mtype}", links)
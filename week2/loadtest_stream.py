@@ -0,0 +1,109 @@
+# coding: utf-8
+
+# Load test of the brochure streaming: N users asking for a brochure at the same time, against the fake LLM server
+# (fake_llm_server.py, started here in its own process), so no API costs and no rate limits of the real APIs.
+# Reports the time to first token (p50 / p99) and the total time of the streams.
+#
+#   python loadtest_stream.py --sessions 200                  # async path (stream_gpt_async), as used by the Gradio app
+#   python loadtest_stream.py --sessions 200 --sync           # sync path (stream_gpt) in a pool of 40 threads, like Gradio's
+#   python loadtest_stream.py --sessions 200 --model Claude --first-token-delay 0.5 --delay 0.02
+
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+PROMPT = "You are looking at a company called: Acme Tools\nHere are the contents of its landing page:\n" + "Acme builds tools. " * 200
+
+
+def start_server(delay, first_token_delay):
+    """fake_llm_server.py in a separate process, so it does not compete with the load test for the GIL."""
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    server = subprocess.Popen([sys.executable, "fake_llm_server.py", str(port), str(delay), str(first_token_delay)],
+                              cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL)
+    for _ in range(100):
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return server, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("fake LLM server did not start")
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+def timed(arrival, updates):
+    """(time to first token, total time) of a stream, counted from when the user asked (all users arrive at once)."""
+    first = updates[0] - arrival if updates else float("nan")
+    return first, (updates[-1] if updates else time.perf_counter()) - arrival
+
+
+async def run_async(brochure, sessions, model):
+    stream = brochure.stream_gpt_async if model == "GPT" else brochure.stream_claude_async
+
+    arrival = time.perf_counter()
+
+    async def session(i):
+        updates = [time.perf_counter() async for _ in stream(f"Acme {i}", "", "brochure", "clients", "formal", "English", PROMPT)]
+        return timed(arrival, updates)
+
+    return await asyncio.gather(*(session(i) for i in range(sessions)))
+
+
+def run_sync(brochure, sessions, model, threads):
+    stream = brochure.stream_gpt if model == "GPT" else brochure.stream_claude
+
+    arrival = time.perf_counter()
+
+    def session(i):
+        updates = [time.perf_counter() for _ in stream(f"Acme {i}", "", "brochure", "clients", "formal", "English", PROMPT)]
+        return timed(arrival, updates)
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(session, range(sessions)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent brochure streams against a local fake LLM server.")
+    parser.add_argument("--sessions", type=int, default=100, help="simultaneous users")
+    parser.add_argument("--model", choices=["GPT", "Claude"], default="GPT")
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds between two streamed words")
+    parser.add_argument("--first-token-delay", type=float, default=0.2, help="seconds before the first word")
+    parser.add_argument("--sync", action="store_true", help="use the sync generators in a thread pool")
+    parser.add_argument("--threads", type=int, default=40, help="thread pool size with --sync (gradio's default is 40)")
+    args = parser.parse_args()
+
+    server, base_url = start_server(args.delay, args.first_token_delay)
+    os.environ.update(OPENAI_BASE_URL=f"{base_url}/v1", ANTHROPIC_BASE_URL=base_url,
+                      OPENAI_API_KEY="fake", ANTHROPIC_API_KEY="fake",
+                      LLM_MAX_CONNECTIONS=str(max(args.sessions, 50)))     # one connection per stream (no HTTP/2 here)
+    import CompanyBrochure          # after the environment is set, it creates the clients on import
+    import ratelimit
+    for model in (CompanyBrochure.MODEL_GPT, CompanyBrochure.MODEL_claude):
+        ratelimit.configure(model, rpm=10 ** 6, tpm=10 ** 9)     # the fake server has no limits
+
+    start = time.perf_counter()
+    if args.sync:
+        results = run_sync(CompanyBrochure, args.sessions, args.model, args.threads)
+    else:
+        results = asyncio.run(run_async(CompanyBrochure, args.sessions, args.model))
+    wall_time = time.perf_counter() - start
+    server.terminate()
+
+    first_tokens = [first for first, _ in results]
+    totals = [total for _, total in results]
+    mode = f"sync, {args.threads} threads" if args.sync else "async"
+    print(f"\n{args.sessions} sessions with {args.model} ({mode}) in {wall_time:.2f}s")
+    print(f"time to first token: p50 {percentile(first_tokens, 50):.3f}s  p99 {percentile(first_tokens, 99):.3f}s  "
+          f"max {max(first_tokens):.3f}s")
+    print(f"stream time:         p50 {percentile(totals, 50):.3f}s  p99 {percentile(totals, 99):.3f}s")
@@ -0,0 +1,145 @@
+# coding: utf-8
+
+# Persistent page cache for the scraping helpers (website.py and crawler.py).
+# We regenerate brochures for the same companies all the time, so downloaded pages are kept
+# in a small SQLite file together with their ETag / Last-Modified validators:
+#
+# - younger than the TTL          -> served straight from the cache, no request at all (hit)
+# - older than the TTL            -> conditional request with If-None-Match / If-Modified-Since,
+#                                    a 304 answer means we reuse the cached body (revalidated)
+# - not in the cache / changed    -> normal download, stored for next time (miss)
+#
+# The counters in page_cache.stats show how many requests and bytes the cache saved.
+#
+# Next to the raw pages it keeps the extracted title / text / links per SHA-256 of the body,
+# so a page that did not change is never parsed again, whichever url it came from.
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_FILE = os.getenv("PAGE_CACHE_FILE", "page_cache.sqlite")
+CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", 24 * 3600))     # seconds a page is served without asking the server
+
+
+class PageCache:
+    def __init__(self, path=CACHE_FILE, ttl=CACHE_TTL):
+        self.path = path
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "revalidated": 0, "bytes_saved": 0, "parsed_hits": 0, "parsed_misses": 0}
+        self._db = None
+        self._lock = threading.Lock()      # the cache is shared by the Gradio worker threads and the crawler loop
+
+    def _conn(self):
+        # open lazily, importing this module should not create files
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("""CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL)""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS parsed (
+                sha256 TEXT PRIMARY KEY,
+                title TEXT,
+                text TEXT NOT NULL,
+                links TEXT NOT NULL)""")
+            self._db.execute("""CREATE TABLE IF NOT EXISTS kv (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                stored_at REAL NOT NULL)""")
+            self._db.commit()
+        return self._db
+
+    def _entry(self, url):
+        row = self._conn().execute(
+            "SELECT body, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"body": row[0], "etag": row[1], "last_modified": row[2], "fetched_at": row[3]}
+
+    def lookup(self, url):
+        """Returns (body, extra_headers): body is set for a fresh hit, otherwise extra_headers holds the validators to send."""
+        with self._lock:
+            entry = self._entry(url)
+            if entry is None:
+                return None, {}
+            if time.time() - entry["fetched_at"] < self.ttl:
+                self.stats["hits"] += 1
+                self.stats["bytes_saved"] += len(entry["body"])
+                return entry["body"], {}
+        validators = {}
+        if entry["etag"]:
+            validators["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            validators["If-Modified-Since"] = entry["last_modified"]
+        return None, validators
+
+    def update(self, url, status_code, body, response_headers):
+        """Process the server response for url and return the body to use."""
+        with self._lock:
+            if status_code == 304:
+                entry = self._entry(url)
+                if entry is not None:
+                    self.stats["revalidated"] += 1
+                    self.stats["bytes_saved"] += len(entry["body"])
+                    self._conn().execute("UPDATE pages SET fetched_at = ? WHERE url = ?", (time.time(), url))
+                    self._conn().commit()
+                    return entry["body"]
+            self.stats["misses"] += 1
+            if status_code == 200:
+                self._conn().execute(
+                    "INSERT OR REPLACE INTO pages (url, body, etag, last_modified, fetched_at) VALUES (?, ?, ?, ?, ?)",
+                    (url, body, response_headers.get("ETag"), response_headers.get("Last-Modified"), time.time()))
+                self._conn().commit()
+            return body
+
+    def get_parsed(self, digest):
+        """Returns (title, text, links) extracted earlier from a body with this SHA-256, or None."""
+        with self._lock:
+            row = self._conn().execute("SELECT title, text, links FROM parsed WHERE sha256 = ?", (digest,)).fetchone()
+            if row is None:
+                self.stats["parsed_misses"] += 1
+                return None
+            self.stats["parsed_hits"] += 1
+            return row[0], row[1], json.loads(row[2])
+
+    def store_parsed(self, digest, title, text, links):
+        with self._lock:
+            self._conn().execute("INSERT OR REPLACE INTO parsed (sha256, title, text, links) VALUES (?, ?, ?, ?)",
+                                 (digest, title, text, json.dumps(links)))
+            self._conn().commit()
+
+    def get_json(self, key, max_age):
+        """Small json values that belong with the pages (e.g. the link selection per domain), None when missing or too old."""
+        with self._lock:
+            row = self._conn().execute("SELECT value, stored_at FROM kv WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > max_age:
+            return None
+        return json.loads(row[0])
+
+    def set_json(self, key, value):
+        with self._lock:
+            self._conn().execute("INSERT OR REPLACE INTO kv (key, value, stored_at) VALUES (?, ?, ?)",
+                                 (key, json.dumps(value), time.time()))
+            self._conn().commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn().execute("DELETE FROM pages")
+            self._conn().execute("DELETE FROM parsed")
+            self._conn().execute("DELETE FROM kv")
+            self._conn().commit()
+
+    def report(self):
+        s = self.stats
+        return (f"Page cache: {s['hits']} hits, {s['revalidated']} revalidated (304), {s['misses']} misses, "
+                f"{s['bytes_saved'] / 1024:.1f} KB not downloaded, "
+                f"{s['parsed_hits']} of {s['parsed_hits'] + s['parsed_misses']} pages not parsed again")
+
+
+# one cache for the whole process
+page_cache = PageCache()
@@ -0,0 +1,181 @@
+# coding: utf-8
+
+# HTML parser backends for Website.
+# Every backend turns the html body into the same (title, text, links) tuple as the original
+# BeautifulSoup code:
+#   title: the string of the first <title>, "No title found" when there is no <title>
+#   text:  all strings inside <body> except script/style, stripped, empty ones dropped, joined by "\n"
+#   links: every non-empty href of an <a> tag, in document order
+#
+# - "html.parser": BeautifulSoup with the pure Python parser (the original behaviour, the reference)
+# - "lxml":        lxml.html, C parser, text collected by walking the tree instead of decompose()
+# - "stream":      streaming extractor on top of the standard library HTMLParser; it never builds a
+#                  tree and just skips the non-text nodes, so it also works on a partial body
+#
+# Pick the backend with the HTML_PARSER environment variable; bench_parsers.py compares them.
+
+import os
+import re
+from html.parser import HTMLParser
+
+DEFAULT_PARSER = os.getenv("HTML_PARSER", "html.parser")
+NO_TITLE = "No title found"
+SKIP_TAGS = ("script", "style", "template")     # img and input are dropped as well in the original, but they hold no text
+HAS_BODY = re.compile(r"<body[\s>/]", re.IGNORECASE)
+
+
+def parse_bs4(body):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(body, 'html.parser')
+    title = soup.title.string if soup.title else NO_TITLE
+    if title is not None:
+        title = str(title)      # plain str, a NavigableString keeps the whole soup alive
+    if soup.body:
+        for irrelevant in soup.body(["script", "style", "img", "input"]):
+            irrelevant.decompose()
+        text = soup.body.get_text(separator="\n", strip=True)
+    else:
+        text = ""
+    links = [link.get('href') for link in soup.find_all('a')]
+    return title, text, [link for link in links if link]
+
+
+def parse_lxml(body):
+    from lxml import html as lxml_html
+    text = decode(body)
+    if not text.strip():
+        return NO_TITLE, "", []
+    doc = lxml_html.document_fromstring(text)
+    title_tag = doc.find(".//title")
+    title = NO_TITLE if title_tag is None else title_tag.text
+    strings = []
+    body_tag = doc.find("body")
+    # lxml always adds a <body>, the reference only has one when the page has one
+    if body_tag is not None and HAS_BODY.search(text):
+        # walk the tree with a stack (deeply nested pages would hit the recursion limit),
+        # a ("tail", element) item emits the text that follows the element once its children are done
+        stack = [body_tag]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, tuple):
+                if item[1].tail:
+                    strings.append(item[1].tail)
+                continue
+            if item is not body_tag:
+                stack.append(("tail", item))
+            # comments and processing instructions have no str tag, only their tail is text
+            if isinstance(item.tag, str) and item.tag not in SKIP_TAGS:
+                if item.text:
+                    strings.append(item.text)
+                stack.extend(reversed(list(item)))
+    body_text = "\n".join(s.strip() for s in strings if s.strip())
+    links = [link.get("href") for link in doc.iter("a")]
+    return title, body_text, [link for link in links if link]
+
+
+class StreamExtractor(HTMLParser):
+    """Collects title, body text and links while the html is fed in, without building a tree."""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.title = None
+        self.in_title = False
+        self.title_seen = False
+        self.in_body = False
+        self.body_seen = False
+        self.skipping = 0
+        self.parts = []         # pieces of the current text node
+        self.strings = []       # stripped, non-empty text nodes of the body
+        self.text_length = 0
+        self.links = []
+
+    def _flush(self):
+        # a tag or comment ends the current text node
+        if self.parts:
+            if self.in_title:
+                self.title = (self.title or "") + "".join(self.parts)
+            elif self.in_body and not self.skipping:
+                string = "".join(self.parts).strip()
+                if string:
+                    self.strings.append(string)
+                    self.text_length += len(string) + 1
+            self.parts = []
+
+    def handle_starttag(self, tag, attrs):
+        self._flush()
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+        elif tag == "title" and not self.title_seen:
+            self.in_title = self.title_seen = True
+        elif tag == "body" and not self.body_seen:
+            self.in_body = self.body_seen = True
+        elif tag in SKIP_TAGS:
+            self.skipping += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._flush()
+        if tag == "a":
+            href = dict(attrs).get("href")
+            if href:
+                self.links.append(href)
+
+    def handle_endtag(self, tag):
+        self._flush()
+        if tag == "title":
+            self.in_title = False
+        elif tag == "body":
+            self.in_body = False
+        elif tag in SKIP_TAGS and self.skipping:
+            self.skipping -= 1
+
+    def handle_data(self, data):
+        if self.in_title or (self.in_body and not self.skipping):
+            self.parts.append(data)
+
+    def handle_comment(self, data):
+        self._flush()
+
+    def result(self):
+        self._flush()
+        title = (self.title if self.title_seen else NO_TITLE)
+        return title, "\n".join(self.strings), self.links
+
+
+def parse_stream(body):
+    extractor = StreamExtractor()
+    extractor.feed(decode(body))
+    extractor.close()
+    return extractor.result()
+
+
+def decode(body):
+    """Bytes to str for the stream backend: declared charset if any, else utf-8 with a cp1252 fallback."""
+    if isinstance(body, str):
+        return body
+    declared = re.search(rb"charset=[\"']?([\w.:-]+)", body[:2048], re.IGNORECASE)
+    if declared:
+        try:
+            return body.decode(declared.group(1).decode("ascii"))
+        except (LookupError, UnicodeDecodeError):
+            pass
+    try:
+        return body.decode("utf-8")
+    except UnicodeDecodeError:
+        return body.decode("cp1252", errors="replace")
+
+
+PARSERS = {
+    "html.parser": parse_bs4,
+    "lxml": parse_lxml,
+    "stream": parse_stream,
+}
+
+
+def parse(body, backend=None):
+    """Extract (title, text, links) from the html body with the chosen backend."""
+    backend = backend or DEFAULT_PARSER
+    if backend not in PARSERS:
+        raise ValueError(f"Unknown html parser backend: {backend}")
+    return PARSERS[backend](body)
@@ -0,0 +1,202 @@
+# coding: utf-8
+
+# Ticket prices for the FlightAI agents (the get_ticket_price tool).
+# flights.xlsx stays the file the prices are maintained in, but it is only parsed (openpyxl) when it changed:
+# it is compiled into a small SQLite file next to it, which is what the agents read.
+#
+# - startup opens the SQLite file; the spreadsheet is only parsed when it is newer than the compiled file
+# - the spreadsheet is checked (at most every PRICE_CHECK_SECONDS) and recompiled when it changed, so new
+#   prices are used without a restart; the new file is built next to the old one and swapped in atomically
+# - city names are normalized (case, accents, spaces, punctuation: "London ", "NEW-YORK"), and a trigram index
+#   finds the closest city for typos ("Londen", "Pariss"); only a real typo counts (about as long, at most
+#   MAX_TYPOS edits), so "Bern" is not Berlin and "Newark" not New York. lookup() tells which city it found,
+#   the caller should not quote that price for the city it was asked about
+# - an optional "aliases" column (comma separated) adds other names of a city ("Bruxelles, Brussel"), which
+#   are indexed like the city name itself
+#
+#   price_store = PriceStore("flights.xlsx", "flights")
+#   price_store.lookup("Londen")   -> ("london", "$799", False)      (name, price, exact match)
+
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+import unicodedata
+
+PRICE_FILE = os.getenv("PRICE_FILE", "flights.xlsx")
+PRICE_SHEET = os.getenv("PRICE_SHEET", "flights")
+PRICE_CHECK_SECONDS = float(os.getenv("PRICE_CHECK_SECONDS", 2))
+FUZZY_THRESHOLD = 0.5       # minimum trigram (Dice) similarity of a candidate for a fuzzy match
+MIN_LENGTH_RATIO = 0.8      # the shorter of the two names is at least this part of the longer one
+MAX_TYPOS = 1               # edits (insert, delete, replace, swap) allowed, one more for names of 8+ characters
+
+_not_word = re.compile(r"[^\w]+")
+
+
+def normalize(city):
+    """Lower case, without accents and punctuation, single spaces."""
+    city = unicodedata.normalize("NFKD", str(city or ""))
+    city = "".join(char for char in city if not unicodedata.combining(char))
+    return _not_word.sub(" ", city.casefold()).strip()
+
+
+def trigrams(name):
+    padded = f"  {name} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def edit_distance(a, b):
+    """Edits (insert, delete, replace, swap of two neighbours) to turn a into b."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (a[i - 1] != b[j - 1]))
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[-1]
+
+
+def is_typo(asked, name):
+    """Is asked (normalized) a misspelling of name, rather than another place?"""
+    if min(len(asked), len(name)) < MIN_LENGTH_RATIO * max(len(asked), len(name)):
+        return False
+    return edit_distance(asked, name) <= MAX_TYPOS + (max(len(asked), len(name)) >= 8)
+
+
+def compile_prices(source, sheet, target):
+    """Read the spreadsheet and write it to a new SQLite file, then move that over target in one step."""
+    from openpyxl import load_workbook     # only needed when the spreadsheet changed
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(values_only=True)
+        header = [str(value).strip().lower() for value in next(rows)]
+        city_column, price_column = header.index("destination"), header.index("ticket_prices")
+        alias_column = header.index("aliases") if "aliases" in header else None
+        prices, names = {}, {}
+        for row in rows:
+            city = normalize(row[city_column])
+            if not city:
+                continue
+            prices[city] = (str(row[city_column]).strip(), str(row[price_column]).strip())
+            aliases = str(row[alias_column] or "").split(",") if alias_column is not None else []
+            for name in [city] + [normalize(alias) for alias in aliases]:
+                if name:
+                    names[name] = city
+    finally:
+        workbook.close()
+
+    stat = os.stat(source)
+    handle, temp_path = tempfile.mkstemp(suffix=".sqlite", dir=os.path.dirname(os.path.abspath(target)))
+    os.close(handle)
+    db = sqlite3.connect(temp_path)
+    try:
+        db.execute("CREATE TABLE prices (city TEXT PRIMARY KEY, name TEXT NOT NULL, price TEXT NOT NULL)")
+        db.execute("CREATE TABLE names (name TEXT PRIMARY KEY, city TEXT NOT NULL, grams INTEGER NOT NULL)")
+        db.execute("CREATE TABLE trigrams (gram TEXT NOT NULL, name TEXT NOT NULL)")
+        db.execute("CREATE INDEX trigrams_gram ON trigrams (gram)")
+        db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.executemany("INSERT INTO prices VALUES (?, ?, ?)", [(city, name, price) for city, (name, price) in prices.items()])
+        for name, city in names.items():
+            grams = trigrams(name)
+            db.execute("INSERT INTO names VALUES (?, ?, ?)", (name, city, len(grams)))
+            db.executemany("INSERT INTO trigrams VALUES (?, ?)", [(gram, name) for gram in grams])
+        db.executemany("INSERT INTO meta VALUES (?, ?)", [("source_mtime", repr(stat.st_mtime)), ("source_size", str(stat.st_size))])
+        db.commit()
+    finally:
+        db.close()
+    os.replace(temp_path, target)
+    print(f"Compiled {len(prices)} ticket prices from {source} into {target}")
+
+
+class PriceStore:
+    def __init__(self, source=PRICE_FILE, sheet=PRICE_SHEET, path=None):
+        self.source = source
+        self.sheet = sheet
+        self.path = path or os.path.splitext(source)[0] + ".sqlite"
+        self.stats = {"exact": 0, "fuzzy": 0, "unknown": 0, "reloads": 0}
+        self._db = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()      # the agents call the tools from several threads
+
+    def _source_stamp(self):
+        try:
+            stat = os.stat(self.source)
+            return repr(stat.st_mtime), str(stat.st_size)
+        except FileNotFoundError:
+            return None
+
+    def _compiled_stamp(self, db):
+        try:
+            meta = dict(db.execute("SELECT key, value FROM meta"))
+            return meta["source_mtime"], meta["source_size"]
+        except (sqlite3.Error, KeyError):
+            return None
+
+    def _conn(self):
+        """The open compiled file, recompiled first when the spreadsheet changed (checked every PRICE_CHECK_SECONDS)."""
+        if self._db is not None and time.monotonic() - self._checked_at < PRICE_CHECK_SECONDS:
+            return self._db
+        self._checked_at = time.monotonic()
+        source = self._source_stamp()
+        if self._db is not None and (source is None or source == self._compiled_stamp(self._db)):
+            return self._db
+        if self._db is None and os.path.exists(self.path):
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            if source is None or source == self._compiled_stamp(self._db):
+                return self._db
+        if source is None:
+            print(f"Error: File '{self.source}' not found.")
+            return self._db
+        try:
+            compile_prices(self.source, self.sheet, self.path)
+        except Exception as e:
+            print(f"Error loading flights data: {e}")
+            return self._db
+        # the old connection still reads the replaced file, the new one the new file
+        if self._db is not None:
+            self._db.close()
+            self.stats["reloads"] += 1
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        return self._db
+
+    def lookup(self, city):
+        """(name, price, exact) of the city, or of the city it is a typo of; None when there is no such city."""
+        key = normalize(city)
+        if not key:
+            return None
+        with self._lock:
+            db = self._conn()
+            if db is None:
+                return None
+            row = db.execute("""SELECT p.name, p.price FROM names n JOIN prices p ON p.city = n.city
+                                WHERE n.name = ?""", (key,)).fetchone()
+            if row is not None:
+                self.stats["exact"] += 1
+                return row[0], row[1], True
+            grams = trigrams(key)
+            placeholders = ",".join("?" * len(grams))
+            candidates = db.execute(f"""SELECT p.name, p.price, n.grams, COUNT(*), n.name FROM trigrams t
+                                        JOIN names n ON n.name = t.name JOIN prices p ON p.city = n.city
+                                        WHERE t.gram IN ({placeholders}) GROUP BY t.name""", tuple(grams)).fetchall()
+            candidates = sorted((c for c in candidates if 2 * c[3] / (c[2] + len(grams)) >= FUZZY_THRESHOLD),
+                                key=lambda c: -2 * c[3] / (c[2] + len(grams)))
+            best = next((c for c in candidates if is_typo(key, c[4])), None)
+            if best is None:
+                self.stats["unknown"] += 1
+                return None
+            self.stats["fuzzy"] += 1
+            return best[0], best[1], False
+
+    def price(self, city):
+        match = self.lookup(city)
+        return match[1] if match else "Unknown"
+
+    def cities(self):
+        with self._lock:
+            db = self._conn()
+            return [row[0] for row in db.execute("SELECT city FROM prices")] if db is not None else []
+
@@ -0,0 +1,120 @@
+# coding: utf-8
+
+# Token budget for the brochure prompt.
+# Instead of glueing every crawled page together and cutting the result at 5,000 characters
+# (so the landing page crowds out everything else and most downloaded pages are thrown away),
+# every page type gets its own share of a total token budget. Pages are truncated to what is
+# left for their type, and get_all_details stops fetching once the budget is used up.
+#
+# Tokens are counted with tiktoken (the tokenizer of the GPT models) when it is installed;
+# without it we fall back to the usual estimate of 4 characters per token.
+
+import os
+
+TOTAL_BUDGET = int(os.getenv("BROCHURE_TOKEN_BUDGET", 1500))
+
+# share of the budget per page type, in order of importance for a brochure
+PAGE_BUDGETS = {
+    "landing": 500,
+    "about": 450,
+    "customers": 300,
+    "products": 300,
+    "careers": 250,
+    "other": 150,
+}
+
+# keywords to map the free-form link type from get_links ("about page", "Careers/Jobs"...) to a page type
+PAGE_TYPE_KEYWORDS = {
+    "about": ("about", "company", "who we are", "story", "mission", "team", "history"),
+    "customers": ("customer", "client", "case", "reference", "testimonial", "success"),
+    "products": ("product", "service", "solution", "offering"),
+    "careers": ("career", "job", "vacanc", "hiring", "join", "work with"),
+}
+
+_encoding = None
+_encoding_loaded = False
+
+
+def _get_encoding():
+    # loaded on first use: importing tiktoken and reading the vocabulary takes a while,
+    # and the vocabulary is downloaded the very first time, which fails when offline
+    global _encoding, _encoding_loaded
+    if not _encoding_loaded:
+        _encoding_loaded = True
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("o200k_base")     # gpt-4o / gpt-4o-mini
+        except ImportError:
+            pass
+        except Exception as e:
+            print(f"tiktoken not available ({e}), estimating 4 characters per token")
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding is None:
+        return (len(text) + 3) // 4
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """Cut text down to max_tokens tokens."""
+    if max_tokens <= 0:
+        return ""
+    encoding = _get_encoding()
+    if encoding is None:
+        return text[:max_tokens * 4]
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+def page_type(link_type):
+    link_type = (link_type or "").lower()
+    if link_type == "landing":
+        return "landing"
+    for mtype, keywords in PAGE_TYPE_KEYWORDS.items():
+        if any(keyword in link_type for keyword in keywords):
+            return mtype
+    return "other"
+
+
+class PromptAssembler:      ## builds the page part of the brochure prompt within the token budget
+    def __init__(self, total=TOTAL_BUDGET, budgets=PAGE_BUDGETS):
+        self.total = total
+        self.budgets = budgets
+        self.used = {}
+        self.total_used = 0
+        self.parts = []
+
+    def priority(self, link_type):
+        """Sort key: the most valuable page types first."""
+        return list(self.budgets).index(page_type(link_type))
+
+    def left(self, link_type):
+        mtype = page_type(link_type)
+        return min(self.budgets[mtype] - self.used.get(mtype, 0), self.total - self.total_used)
+
+    def wants(self, link_type):
+        return self.left(link_type) > 0
+
+    def is_full(self):
+        return self.total_used >= self.total
+
+    def add(self, label, link_type, contents):
+        """Add a page under label, truncated to what is left for its type; returns the text that was added."""
+        header = f"{label}:\n" if not self.parts else f"\n\n{label}\n"
+        text = truncate_tokens(header + contents, self.left(link_type))
+        if not text:
+            return ""
+        tokens = count_tokens(text)
+        mtype = page_type(link_type)
+        self.used[mtype] = self.used.get(mtype, 0) + tokens
+        self.total_used += tokens
+        self.parts.append(text)
+        return text
+
+    def text(self):
+        return "".join(self.parts)
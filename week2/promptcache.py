@@ -0,0 +1,69 @@
+# coding: utf-8
+
+# Provider-side prompt caching for the chat apps.
+# The chats send the same long system message (and the same tool definitions) on every turn. Both providers can
+# cache the processing of a prompt prefix, which cuts the time to first token and the price of those input tokens:
+# - OpenAI does it automatically for prompts over 1024 tokens, as long as the start of the prompt (tools, then
+#   messages) is byte-identical to an earlier request. So the static system message comes first and stays
+#   untouched; everything that changes per turn (a note, the history summary) goes in separate messages after it.
+# - Anthropic only caches what is marked with cache_control: system_blocks() marks the static system message.
+#   (The minimum is 1024 tokens, 2048 for the Haiku models; shorter prompts are simply not cached.)
+#
+# Every turn prints how many input tokens were cached, and the totals are kept in prompt_cache_stats.
+# For OpenAI streams pass STREAM_USAGE (the usage only comes along when asked for) and read the text with openai_pieces().
+
+import threading
+
+STREAM_USAGE = {"include_usage": True}      # stream_options for OpenAI, adds a last chunk with the usage
+
+prompt_cache_stats = {"requests": 0, "input_tokens": 0, "cached_tokens": 0, "cache_write_tokens": 0}
+_lock = threading.Lock()
+
+
+def system_blocks(system_message, *dynamic):
+    """Anthropic system parameter: the static system message, marked for caching, then the per-turn parts."""
+    blocks = [{"type": "text", "text": system_message, "cache_control": {"type": "ephemeral"}}]
+    return blocks + [{"type": "text", "text": text} for text in dynamic if text]
+
+
+def _report(label, input_tokens, cached, written=0):
+    with _lock:
+        prompt_cache_stats["requests"] += 1
+        prompt_cache_stats["input_tokens"] += input_tokens
+        prompt_cache_stats["cached_tokens"] += cached
+        prompt_cache_stats["cache_write_tokens"] += written
+    extra = f", {written} written to the cache" if written else ""
+    print(f"{label}: {cached} of {input_tokens} input tokens from the prompt cache{extra}")
+
+
+def report_openai(usage, label="OpenAI"):
+    if usage is None:
+        return
+    details = getattr(usage, "prompt_tokens_details", None)
+    _report(label, usage.prompt_tokens, getattr(details, "cached_tokens", None) or 0)
+
+
+def report_anthropic(usage, label="Anthropic"):
+    if usage is None:
+        return
+    cached = getattr(usage, "cache_read_input_tokens", None) or 0
+    written = getattr(usage, "cache_creation_input_tokens", None) or 0
+    # input_tokens only counts what came after the last cache breakpoint
+    _report(label, usage.input_tokens + cached + written, cached, written)
+
+
+def openai_pieces(stream, label="OpenAI"):
+    """The text pieces of an OpenAI chat stream, reporting the usage chunk at the end."""
+    for chunk in stream:
+        if chunk.usage:
+            report_openai(chunk.usage, label)
+        if chunk.choices:
+            yield chunk.choices[0].delta.content
+
+
+async def openai_pieces_async(stream, label="OpenAI"):
+    async for chunk in stream:
+        if chunk.usage:
+            report_openai(chunk.usage, label)
+        if chunk.choices:
+            yield chunk.choices[0].delta.content
@@ -0,0 +1,281 @@
+# coding: utf-8
+
+# Shared rate limiting for every OpenAI / Anthropic call in the apps and batch jobs.
+# The Gradio apps and brochure_batch.py use the same API keys; without coordination a burst of batch jobs
+# runs into 429 errors and we burn time on retries. Here every call first takes from two token buckets
+# of its model (requests per minute and tokens per minute) and then goes out.
+#
+# - interactive calls (chat, Gradio) go before batch calls that are waiting for the same model;
+#   batch code marks its calls with `with ratelimit.priority(ratelimit.BATCH):`
+# - a 429 pauses that model for everybody (Retry-After when the API sends it), and the call is retried
+#   with exponential backoff and jitter
+#
+#   response = ratelimit.call("gpt-4o-mini", openai.chat.completions.create, model=..., messages=...)
+#
+# Async code uses call_async / acquire_async, which wait on the event loop itself (no thread per waiting call),
+# in the same queue as the threads.
+#
+# The streaming helpers of Anthropic (messages.stream) only send the request when the `with` block is entered,
+# so they go through stream / stream_async, which enter it within the limits and with the same 429 retries:
+#
+#   with ratelimit.stream("claude-3-haiku-20240307", claude.messages.stream, model=..., messages=...) as stream:
+#       for text in stream.text_stream: ...
+
+import asyncio
+import heapq
+import itertools
+import random
+import threading
+import time
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
+
+from prompt_budget import count_tokens
+
+INTERACTIVE = 0
+BATCH = 1
+
+# (requests per minute, tokens per minute) per model, change them with configure()
+DEFAULT_LIMITS = {
+    "gpt-4o-mini": (500, 200_000),
+    "claude-3-haiku-20240307": (50, 50_000),
+}
+FALLBACK_LIMITS = (60, 60_000)
+MAX_RETRIES = 5
+BASE_BACKOFF = 1.0          # seconds, doubled on every retry
+MAX_BACKOFF = 60.0
+DEFAULT_OUTPUT_TOKENS = 1000
+
+
+class TokenBucket:          ## per_minute units, refilled continuously
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until amount can be taken (a request bigger than the bucket only waits for a full bucket)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        return 0.0 if self.available >= amount else (amount - self.available) / self.rate
+
+    def take(self, amount):
+        self.available -= min(amount, self.capacity)
+
+
+class ModelLimiter:         ## the buckets of one model plus the queue of callers waiting for them
+    def __init__(self, rpm, tpm):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.paused_until = 0.0
+        self.waiting = []               # heap of (priority, ticket number)
+        self.condition = threading.Condition()
+        self.async_waiters = set()      # (event loop, asyncio.Event) of the async callers waiting
+
+    def _ready(self, ticket, tokens):
+        """With the lock held: 0 when the call may go out now (it takes from the buckets), otherwise the seconds
+        to wait, None (wait until notified) when other calls are before it."""
+        if self.waiting[0] != ticket:
+            return None
+        now = time.monotonic()
+        delay = max(self.paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(tokens, now))
+        if delay > 0:
+            return delay
+        self.requests.take(1)
+        self.tokens.take(tokens)
+        return 0
+
+    def _notify(self):
+        self.condition.notify_all()
+        for loop, event in self.async_waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass        # that loop is closed
+
+    def _leave(self, ticket):
+        self.waiting.remove(ticket)
+        heapq.heapify(self.waiting)
+        self._notify()
+
+    def acquire(self, tokens, priority=INTERACTIVE):
+        """Block until this call may go out; lower priority numbers are served first, then first come first served."""
+        with self.condition:
+            ticket = (priority, next(_tickets))
+            heapq.heappush(self.waiting, ticket)
+            try:
+                while True:
+                    delay = self._ready(ticket, tokens)
+                    if delay == 0:
+                        return
+                    self.condition.wait(delay)
+            finally:
+                self._leave(ticket)
+
+    async def acquire_async(self, tokens, priority=INTERACTIVE):
+        """acquire() for async code: waits with asyncio, the event loop and the worker threads stay free."""
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with self.condition:
+            ticket = (priority, next(_tickets))
+            heapq.heappush(self.waiting, ticket)
+            self.async_waiters.add(waiter)
+        try:
+            while True:
+                with self.condition:
+                    # cleared under the lock: a notify from now on sets it again
+                    waiter[1].clear()
+                    delay = self._ready(ticket, tokens)
+                if delay == 0:
+                    return
+                try:
+                    await asyncio.wait_for(waiter[1].wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            with self.condition:
+                self.async_waiters.discard(waiter)
+                self._leave(ticket)
+
+    def pause(self, seconds):
+        """After a 429 nobody calls this model for a while."""
+        with self.condition:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self._notify()
+
+
+_tickets = itertools.count()
+_limiters = {}
+_limiters_lock = threading.Lock()
+_local = threading.local()
+
+
+def limiter(model):
+    with _limiters_lock:
+        if model not in _limiters:
+            _limiters[model] = ModelLimiter(*DEFAULT_LIMITS.get(model, FALLBACK_LIMITS))
+        return _limiters[model]
+
+
+def configure(model, rpm=None, tpm=None):
+    """Change the limits of a model (e.g. for another usage tier)."""
+    default_rpm, default_tpm = DEFAULT_LIMITS.get(model, FALLBACK_LIMITS)
+    with _limiters_lock:
+        _limiters[model] = ModelLimiter(rpm or default_rpm, tpm or default_tpm)
+
+
+@contextmanager
+def priority(level):
+    """Calls made in this thread inside the with block get this priority."""
+    previous = getattr(_local, "priority", INTERACTIVE)
+    _local.priority = level
+    try:
+        yield
+    finally:
+        _local.priority = previous
+
+
+def current_priority():
+    return getattr(_local, "priority", INTERACTIVE)
+
+
+def estimate_tokens(messages=(), system="", max_tokens=None):
+    """Input plus maximum output tokens of a chat call, what the tokens-per-minute limit counts."""
+    text = system if isinstance(system, str) else str(system)
+    if isinstance(messages, str):
+        messages = [{"content": messages}]
+    for message in messages:
+        content = message.get("content") if isinstance(message, dict) else getattr(message, "content", "")
+        text += "\n" + (content if isinstance(content, str) else str(content or ""))
+    return count_tokens(text) + (max_tokens or DEFAULT_OUTPUT_TOKENS)
+
+
+def acquire(model, tokens, level=None):
+    limiter(model).acquire(tokens, current_priority() if level is None else level)
+
+
+def _retry_after(error):
+    response = getattr(error, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _backoff(model, error, attempt):
+    """After a failed call: pause the model and return True when it should be tried again (a 429)."""
+    if getattr(error, "status_code", None) != 429 or attempt == MAX_RETRIES:
+        return False
+    # full jitter, so the callers that got a 429 together do not come back together
+    delay = _retry_after(error) or random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+    print(f"Rate limited on {model}, retrying in {delay:.1f}s")
+    limiter(model).pause(delay)
+    return True
+
+
+def _tokens(kwargs):
+    return estimate_tokens(kwargs.get("messages", ()), kwargs.get("system", ""), kwargs.get("max_tokens"))
+
+
+def call(model, fn, /, *args, **kwargs):
+    """Call fn(*args, **kwargs) (an OpenAI or Anthropic client method) within the limits of model, retrying on 429."""
+    tokens = _tokens(kwargs)
+    for attempt in range(MAX_RETRIES + 1):
+        acquire(model, tokens)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not _backoff(model, e, attempt):
+                raise
+
+
+@contextmanager
+def stream(model, fn, /, *args, **kwargs):
+    """Enter the stream manager fn(*args, **kwargs) (e.g. claude.messages.stream) within the limits of model,
+    retrying on 429; the body of the with block gets the stream."""
+    tokens = _tokens(kwargs)
+    with ExitStack() as stack:
+        for attempt in range(MAX_RETRIES + 1):
+            acquire(model, tokens)
+            try:
+                result = stack.enter_context(fn(*args, **kwargs))
+                break
+            except Exception as e:
+                if not _backoff(model, e, attempt):
+                    raise
+        yield result
+
+
+async def acquire_async(model, tokens, level=None):
+    await limiter(model).acquire_async(tokens, current_priority() if level is None else level)
+
+
+async def call_async(model, fn, /, *args, **kwargs):
+    """call() for the methods of the async clients (AsyncOpenAI, AsyncAnthropic)."""
+    tokens = _tokens(kwargs)
+    for attempt in range(MAX_RETRIES + 1):
+        await acquire_async(model, tokens)
+        try:
+            return await fn(*args, **kwargs)
+        except Exception as e:
+            if not _backoff(model, e, attempt):
+                raise
+
+
+@asynccontextmanager
+async def stream_async(model, fn, /, *args, **kwargs):
+    """stream() for the async clients: async with ratelimit.stream_async(model, aclaude.messages.stream, ...)"""
+    tokens = _tokens(kwargs)
+    async with AsyncExitStack() as stack:
+        for attempt in range(MAX_RETRIES + 1):
+            await acquire_async(model, tokens)
+            try:
+                result = await stack.enter_async_context(fn(*args, **kwargs))
+                break
+            except Exception as e:
+                if not _backoff(model, e, attempt):
+                    raise
+        yield result
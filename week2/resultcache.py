@@ -0,0 +1,76 @@
+# coding: utf-8
+
+# In-memory cache of generated brochures.
+# Marketing often submits exactly the same form twice; the second time the brochure is streamed
+# back from here in milliseconds instead of paying for a new LLM call.
+#
+# The key holds the normalized form inputs plus a hash of the crawled content, so a changed website
+# gives a new brochure. Entries expire after a TTL, and the least recently used one is dropped when full.
+
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", 256))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", 24 * 3600))
+REPLAY_CHUNK = 200          # characters per update when a cached brochure is streamed back
+
+_spaces = re.compile(r"\s+")
+
+
+def normalize(value):
+    return _spaces.sub(" ", str(value or "")).strip().casefold()
+
+
+def make_key(*inputs, content=""):
+    """Key from the form inputs (company, url, type, audience, tone, language, model) and the crawled content."""
+    content_hash = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    return tuple(normalize(value) for value in inputs) + (content_hash,)
+
+
+class ResultCache:
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.entries = OrderedDict()        # key -> (stored_at, markdown), oldest use first
+        self.stats = {"hits": 0, "misses": 0}
+        self._lock = threading.Lock()      # Gradio runs requests in several threads
+
+    def get(self, key):
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or time.time() - entry[0] > self.ttl:
+                self.entries.pop(key, None)
+                self.stats["misses"] += 1
+                return None
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[1]
+
+    def put(self, key, markdown):
+        with self._lock:
+            self.entries[key] = (time.time(), markdown)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def stream(self, key, generator):
+        """Pass the updates of a streaming generator through, and keep the final result once it is complete."""
+        result = None
+        for result in generator:
+            yield result
+        if result:
+            self.put(key, result)
+
+
+def replay(markdown, chunk_size=REPLAY_CHUNK):
+    """Stream a cached brochure the same way the model generators do: the growing text, piece by piece."""
+    for end in range(chunk_size, len(markdown) + chunk_size, chunk_size):
+        yield markdown[:end]
+
+
+# one cache for the whole process
+result_cache = ResultCache()
@@ -0,0 +1,143 @@
+# coding: utf-8
+
+# Semantic cache of chat answers, for the FAQ-style questions customers keep asking ("are hats on sale?",
+# "where do you fly to?"). Before the chat calls the API, the question is embedded and compared (cosine
+# similarity) with the questions answered before in the same namespace (one per persona/bot); above the
+# threshold the earlier answer is returned right away, without an API call.
+#
+# - only the question is embedded, with sentence-transformers (pip install sentence-transformers); without it
+#   the cache only answers the same question again (case, punctuation and spaces ignored): character similarity
+#   cannot tell "do you have hats?" from "do you have shoes?"
+# - the last answer of the assistant is the context of the question: an entry is only used after exactly the
+#   same answer (a hash of it), so "and how much is that?" is not answered from another conversation
+# - per namespace at most SEMANTIC_CACHE_SIZE entries, the least recently used one is dropped
+# - turns that need a tool (a price lookup, a booking) are never answered from or stored in the cache,
+#   the caller decides that with the bypass argument / by not storing them
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", 500))
+THRESHOLD = 0.92            # minimum cosine similarity of two questions
+
+_model = None
+_model_loaded = False
+_model_lock = threading.Lock()
+_spaces = re.compile(r"\s+")
+_punctuation = re.compile(r"[^\w\s]")
+
+
+def _get_model():
+    # loaded on first use, importing torch and reading the model takes a few seconds
+    global _model, _model_loaded
+    with _model_lock:
+        if not _model_loaded:
+            _model_loaded = True
+            try:
+                from sentence_transformers import SentenceTransformer
+                _model = SentenceTransformer(EMBEDDING_MODEL)
+            except ImportError:
+                pass
+            except Exception as e:
+                print(f"Embedding model not available ({e}), exact-match only")
+    return _model
+
+
+def backend():
+    return "model" if _get_model() is not None else "exact"
+
+
+def normalize(question):
+    return _spaces.sub(" ", _punctuation.sub(" ", str(question).casefold())).strip()
+
+
+def embed(text):
+    """Unit length embedding of text, None without an embedding model."""
+    model = _get_model()
+    if model is None:
+        return None
+    vector = np.asarray(model.encode(text), dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def context_key(history=()):
+    """Hash of the last answer of the assistant, "" at the start of a conversation."""
+    last_answer = next((msg["content"] for msg in reversed(history) if msg.get("role") == "assistant"), "")
+    return hashlib.blake2b(str(last_answer).encode("utf-8"), digest_size=16).hexdigest() if last_answer else ""
+
+
+class _Namespace:
+    def __init__(self):
+        self.entries = OrderedDict()    # (context, normalized question) -> (vector, answer), oldest use first
+        self.matrix = None              # the vectors stacked, rebuilt after a change
+        self.keys = []
+
+
+class SemanticCache:
+    def __init__(self, max_entries=SEMANTIC_CACHE_SIZE, threshold=None):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.namespaces = {}
+        self.stats = {"hits": 0, "misses": 0, "bypassed": 0}
+        self._lock = threading.Lock()
+
+    def _threshold(self):
+        return self.threshold if self.threshold is not None else THRESHOLD
+
+    def _similar(self, space, context, vector):
+        """Key of the most similar question asked after the same answer, None when none is similar enough."""
+        if space.matrix is None:
+            space.keys = list(space.entries)
+            space.matrix = np.stack([space.entries[key][0] for key in space.keys])
+        scores = space.matrix @ vector
+        # only the questions with the same context count
+        scores[[key[0] != context for key in space.keys]] = -1.0
+        best = int(np.argmax(scores))
+        return space.keys[best] if scores[best] >= self._threshold() else None
+
+    def get(self, namespace, question, history=(), bypass=False):
+        """The cached answer of a similar question in this namespace, or None."""
+        if bypass:
+            with self._lock:
+                self.stats["bypassed"] += 1
+            return None
+        key = (context_key(history), normalize(question))
+        vector = embed(key[1])
+        with self._lock:
+            space = self.namespaces.get(namespace)
+            if space is None or not space.entries:
+                self.stats["misses"] += 1
+                return None
+            if key not in space.entries:
+                # without an embedding model only the same question counts
+                key = self._similar(space, key[0], vector) if vector is not None else None
+            if key is None:
+                self.stats["misses"] += 1
+                return None
+            space.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return space.entries[key][1]
+
+    def put(self, namespace, question, answer, history=()):
+        if not answer:
+            return
+        key = (context_key(history), normalize(question))
+        vector = embed(key[1])
+        with self._lock:
+            space = self.namespaces.setdefault(namespace, _Namespace())
+            space.entries[key] = (vector, answer)
+            space.entries.move_to_end(key)
+            while len(space.entries) > self.max_entries:
+                space.entries.popitem(last=False)
+            space.matrix = None
+
+
+# one cache for the whole process
+semantic_cache = SemanticCache()
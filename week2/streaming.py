@@ -0,0 +1,56 @@
+# coding: utf-8
+
+# Turn a stream of small text pieces (the tokens of an LLM stream) into a few larger updates for Gradio.
+# The generators used to do `result += piece; yield result` for every token: string building that grows
+# with the square of the length, and one UI update per token (~2000 for a brochure).
+# Here the pieces are collected in a list and the full text is only joined and yielded every STREAM_INTERVAL
+# seconds, plus once at the end; for a brochure that is a few dozen updates.
+#
+#   yield from coalesce(chunk.choices[0].delta.content for chunk in stream)
+
+import os
+import time
+
+STREAM_INTERVAL = float(os.getenv("STREAM_INTERVAL", 0.05))   # seconds between two updates
+
+
+class _Buffer:
+    def __init__(self, interval):
+        self.interval = interval
+        self.parts = []
+        self.pending = False
+        self.last = float("-inf")     # the first piece is shown right away
+
+    def add(self, piece):
+        """Add a piece, returns True when an update is due."""
+        if piece:
+            self.parts.append(piece)
+            self.pending = True
+        return self.pending and time.monotonic() - self.last >= self.interval
+
+    def text(self):
+        text = "".join(self.parts)
+        self.parts = [text]
+        self.pending = False
+        self.last = time.monotonic()
+        return text
+
+
+def coalesce(pieces, interval=STREAM_INTERVAL):
+    """Yield the text so far at most every interval seconds, and the complete text at the end."""
+    buffer = _Buffer(interval)
+    for piece in pieces:
+        if buffer.add(piece):
+            yield buffer.text()
+    if buffer.pending or not buffer.parts:
+        yield buffer.text()
+
+
+async def coalesce_async(pieces, interval=STREAM_INTERVAL):
+    """coalesce() for an async iterator of pieces."""
+    buffer = _Buffer(interval)
+    async for piece in pieces:
+        if buffer.add(piece):
+            yield buffer.text()
+    if buffer.pending or not buffer.parts:
+        yield buffer.text()
@@ -0,0 +1,68 @@
+# coding: utf-8
+
+# Tool calling loop for the agents (MultiAgent.py, MultiAgent2.py).
+# The model may ask for several tools in one answer ("what does London cost and book it for Friday" gives a price
+# lookup and a booking); all of them are run at the same time in a thread pool (the calendar booking is blocking
+# network I/O), every result goes back to the model, and the model is called again. That repeats while the model
+# keeps asking for tools, at most MAX_TOOL_ROUNDS times.
+#
+#   response, calls = chat_with_tools(create, messages, tools, {"get_ticket_price": price_tool, ...})
+#
+# create(**kwargs) makes the chat completion call (model, rate limiting... are up to the caller), handlers map
+# the tool names to python functions that get the tool arguments as keyword arguments.
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+MAX_TOOL_ROUNDS = int(os.getenv("MAX_TOOL_ROUNDS", 4))
+TOOL_WORKERS = int(os.getenv("TOOL_WORKERS", 8))
+
+_pool = ThreadPoolExecutor(max_workers=TOOL_WORKERS, thread_name_prefix="tool")
+
+
+def _arguments(tool_call):
+    try:
+        return json.loads(tool_call.function.arguments or "{}")
+    except ValueError:
+        return {}
+
+
+def run_tool(tool_call, handlers):
+    """Run one tool call, returns its tool message; errors are reported to the model instead of raised."""
+    name = tool_call.function.name
+    try:
+        arguments = json.loads(tool_call.function.arguments or "{}")
+        if name not in handlers:
+            raise ValueError(f"Unknown tool {name}")
+        result = handlers[name](**arguments)
+    except Exception as e:
+        print(f"Tool {name} failed: {e}")
+        result = {"error": str(e)}
+    return {"role": "tool", "content": result if isinstance(result, str) else json.dumps(result),
+            "tool_call_id": tool_call.id}
+
+
+def run_tool_calls(tool_calls, handlers):
+    """Run all tool calls of one answer at the same time, returns their tool messages in the same order."""
+    if len(tool_calls) == 1:
+        return [run_tool(tool_calls[0], handlers)]
+    return list(_pool.map(lambda tool_call: run_tool(tool_call, handlers), tool_calls))
+
+
+def chat_with_tools(create, messages, tools, handlers, max_rounds=MAX_TOOL_ROUNDS):
+    """Call the model and run the tools it asks for until it answers; returns (last response, [(tool name, arguments)]).
+
+    messages is extended with the tool calls and results."""
+    calls = []
+    response = create(messages=messages, tools=tools)
+    for depth in range(max_rounds):
+        message = response.choices[0].message
+        if response.choices[0].finish_reason != "tool_calls" or not message.tool_calls:
+            break
+        messages.append(message)
+        messages.extend(run_tool_calls(message.tool_calls, handlers))
+        calls += [(tool_call.function.name, _arguments(tool_call)) for tool_call in message.tool_calls]
+        # the same tools on every call (the prompt cache reuses the start of the prompt); in the last round no more tools
+        response = create(messages=messages, tools=tools, tool_choice="auto" if depth < max_rounds - 1 else "none")
+    return response, calls
@@ -0,0 +1,123 @@
+# coding: utf-8
+
+# Scraping helpers shared by the brochure apps.
+# Website used to live in CompanyBrochure.py; it is now here so the crawl engine
+# (crawler.py) can build Website objects from pages it downloaded itself.
+
+import codecs
+import hashlib
+import os
+from urllib.parse import urlsplit
+
+import requests
+
+from pagecache import page_cache
+from parsers import StreamExtractor, parse
+
+# Some websites need you to use proper headers when fetching them:
+headers = {
+ "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/117.0.0.0 Safari/537.36"
+}
+
+# Downloads are streamed and capped: a huge page, or a pdf/video link picked by get_links, should not end up
+# completely in memory when the brochure prompt only keeps a few thousand characters anyway.
+MAX_PAGE_BYTES = int(os.getenv("MAX_PAGE_BYTES", 2_000_000))   # hard cap on the downloaded body
+MAX_PAGE_TEXT = int(os.getenv("MAX_PAGE_TEXT", 20_000))        # stop reading once this much body text came in
+CHUNK_SIZE = 64 * 1024
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+BINARY_EXTENSIONS = (".pdf", ".zip", ".jpg", ".jpeg", ".png", ".gif", ".svg", ".webp", ".mp3", ".mp4",
+                     ".mov", ".avi", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx")
+
+
+def check_url(url):
+    """Refuse links that are obviously not web pages before making any request."""
+    if urlsplit(url).path.lower().endswith(BINARY_EXTENSIONS):
+        raise ValueError(f"Not an html page: {url}")
+
+
+def check_content_type(url, response_headers):
+    """Refuse non-html responses based on the headers, before the body is downloaded."""
+    content_type = response_headers.get("Content-Type", "")
+    if content_type and content_type.split(";")[0].strip().lower() not in HTML_TYPES:
+        raise ValueError(f"Not an html page: {url} ({content_type})")
+
+
+class BodyReader:           ## collects the chunks of a streamed response until the byte cap is hit or there is enough text
+    def __init__(self, max_bytes=MAX_PAGE_BYTES, max_text=MAX_PAGE_TEXT):
+        self.max_bytes = max_bytes
+        self.max_text = max_text
+        self.chunks = []
+        self.size = 0
+        # the stream extractor only counts the body text here; the real parsing happens later in Website
+        self.extractor = StreamExtractor()
+        self.decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+    def add(self, chunk):
+        """Add a chunk, returns False when we have read enough."""
+        self.chunks.append(chunk)
+        self.size += len(chunk)
+        if self.max_text:
+            self.extractor.feed(self.decoder.decode(chunk))
+            if self.extractor.text_length >= self.max_text:
+                return False
+        return self.size < self.max_bytes
+
+    def body(self):
+        return b"".join(self.chunks)[:self.max_bytes]
+
+
+def fetch(url):
+    """Download url through the persistent page cache (see pagecache.py)."""
+    check_url(url)
+    body, validators = page_cache.lookup(url)
+    if body is not None:
+        return body
+    with requests.get(url, headers={**headers, **validators}, stream=True) as response:
+        body = b""
+        if response.status_code != 304:
+            check_content_type(url, response.headers)
+            reader = BodyReader()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if not reader.add(chunk):
+                    break
+            body = reader.body()
+    return page_cache.update(url, response.status_code, body, response.headers)
+
+
+class Website:              ## A utility class to represent a Website that we have scraped, now with links
+    def __init__(self, url, body=None):
+        self.url = url
+        if body is None:
+            # no body handed over by the crawler, so fetch the page ourselves
+            body = fetch(url)
+        self.body = body
+        # unchanged html (same SHA-256) was parsed before: reuse the extracted parts instead of parsing again
+        digest = hashlib.sha256(body).hexdigest()
+        parsed = page_cache.get_parsed(digest)
+        if parsed is None:
+            parsed = parse(body)        # backend picked with HTML_PARSER, see parsers.py
+            page_cache.store_parsed(digest, *parsed)
+        self.title, self.text, self.links = parsed
+
+    def get_contents(self, text=None):
+        # text: the page text after cleaning (e.g. without the boilerplate of dedup.py), default the full text
+        if text is None:
+            text = self.text
+        return f"Webpage Title:\n{self.title}\nWebpage Contents:\n{text}\n\n"
+
+
+class PageRegistry:         ## request-scoped store of Website objects: a url is downloaded and parsed at most once per brochure run
+    def __init__(self):
+        self.pages = {}
+
+    def __contains__(self, url):
+        return url in self.pages
+
+    def add(self, website):
+        self.pages[website.url] = website
+        return website
+
+    def get(self, url):
+        if url not in self.pages:
+            self.add(Website(url))
+        return self.pages[url]